@@ -1,8 +1,8 @@
 import streamlit as st
 import atexit
+import functools
+import io
 import os
-from datetime import datetime
-import html
 from PIL import ImageGrab  # Add this import
 import time  # Add this import
 import base64  # Add this import
@@ -14,530 +14,462 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-from utils.api import OpenDBAPI
+from utils.api import (CategoryCatalog, FetchSpec, OpenDBAPI, OpenDBError, QuestionBank, default_scheduler,
+                       question_hash)
 from utils.db import Database
+from utils.dedup import Deduplicator
+from utils.export import EXPORT_MIME_TYPES, export_questions
+from utils.metrics import metrics, start_metrics_server
+from utils.prefetch import QueuePrefetcher
+from utils.render import QuestionRenderer, question_options
+from utils.review_queue import ReviewQueue
+from utils.unit_of_work import UnitOfWork
 import json
 import requests
 
 # Initialize Database singleton with absolute path
 @st.cache_resource
 def init_db():
-    db = Database(db_path='quiz_app.db')  # Specify absolute path
+    db = Database(db_path='quiz_app.db', write_behind=True)  # Specify absolute path
     return db
 
-# Clear cache to ensure the latest version of the Database class is used
-st.cache_resource.clear()
-
-# Get database instance
-db = init_db()
+# Local question bank shared by every session
+@st.cache_resource
+def init_bank():
+    return QuestionBank(db_path='question_bank.db')
 
-# Ensure connection is released when the script reruns
-if 'db_initialized' not in st.session_state:
-    db.release_connection()
-    st.session_state.db_initialized = True
-
-# Category Mapping
-CATEGORIES = {
-    "General Knowledge": 9,
-    "Entertainment: Books": 10,
-    "Entertainment: Film": 11,
-    "Entertainment: Music": 12,
-    "Entertainment: Musicals & Theatres": 13,
-    "Entertainment: Television": 14,
-    "Entertainment: Video Games": 15,
-    "Entertainment: Board Games": 16,
-    "Science & Nature": 17,
-    "Science: Computers": 18,
-    "Science: Mathematics": 19,
-    "Mythology": 20,
-    "Sports": 21,
-    "Geography": 22,
-    "History": 23,
-    "Politics": 24,
-    "Art": 25,
-    "Celebrities": 26,
-    "Animals": 27,
-    "Vehicles": 28,
-    "Entertainment: Comics": 29,
-    "Science: Gadgets": 30,
-    "Entertainment: Japanese Anime & Manga": 31,
-    "Entertainment: Cartoon & Animations": 32,
-    "Any Category": None
-}
-
-# Initialize Session State
-if 'crossed_questions' not in st.session_state:
-    st.session_state.crossed_questions = []
-if 'ticked_questions' not in st.session_state:
-    st.session_state.ticked_questions = []
-if 'current_question' not in st.session_state:
-    st.session_state.current_question = 0
-if 'questions' not in st.session_state:
-    st.session_state.questions = []
-
-# User Authentication
-st.sidebar.header("User Authentication")
-username = st.sidebar.text_input("Enter your username", value="0")
-if username == "":
-    username = "0"
-
-# Check if username exists, if not and not "0", add to database
-if username != "0":
-    if not db.add_user(username):
-        st.sidebar.error("Username already taken. Please choose another one.")
-        st.stop()
-user_id = db.get_user_id(username)
-
-# Sidebar - Reset Database (for testing purposes)
-if st.sidebar.button("Reset Database"):
-    db.reset_database()
-    st.sidebar.success("Database reset successfully. Please reload the app.")
-
-# Sidebar - Selection
-st.sidebar.header("Quiz Parameters")
-with st.sidebar.form(key='parameters'):
-    category = st.selectbox("Category", list(CATEGORIES.keys()))
-    difficulty = st.selectbox("Difficulty", ["Any", "Easy", "Medium", "Hard"])
-    q_type = st.selectbox("Type", ["Any", "Multiple Choice", "True / False"])
-    amount = st.slider("Number of Questions", 1, 49, 10)
-    submit = st.form_submit_button("Fetch Questions")
-
-# Fetch Questions
-if submit:
-    selected_category = CATEGORIES[category]
-    selected_difficulty = None if difficulty == "Any" else difficulty.lower()
-    selected_type = None
-    if q_type == "Multiple Choice":
-        selected_type = "multiple"
-    elif q_type == "True / False":
-        selected_type = "boolean"
-
-    api = OpenDBAPI(amount=amount, category=selected_category,
-                   difficulty=selected_difficulty, question_type=selected_type)
-    try:
-        data = api.fetch_questions()
-        st.session_state.questions = data.get('results', [])
-        st.session_state.current_question = 0
-        # Store fetched questions in the database and save the history_id
-        for question in st.session_state.questions:
-            history_id = db.add_question_history(user_id, question)
-            question['history_id'] = history_id  # Store the history_id in the question dict
-    except requests.exceptions.HTTPError as e:
-        st.error(f"Error fetching questions: {e}")
-
-# Add custom CSS
-st.markdown("""
-<style>
-    /* Remove ALL white spaces and padding */
-    .block-container {
-        padding-top: 1rem !important;
-        padding-bottom: 1rem !important;
-    }
-    
-    /* Fix sidebar padding */
-    .css-1d391kg {
-        padding-top: 1rem;
-    }
-    
-    /* Remove top margin from sidebar header */
-    .css-163ttbj {
-        margin-top: 1rem;
-    }
-    
-    /* Remove the Streamlit header to eliminate white box */
-    header.css-1avcm0n.edgvbvh3 {
-        visibility: hidden;
-    }
-    
-    /* Alternatively, target the header more specifically */
-    .css-1aumxhk.e1fqkh3o3 {
-        display: none;
-    }
-    
-    .main > div {
-        padding-top: 1rem !important;
-    }
-    
-    /* Enhanced question card with shadow */
-    .question-text {
-        font-size: 20px !important;
-        padding: 15px;
-        line-height: 1.5;
-        background-color: white;
-        border-radius: 10px;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        margin-bottom: 20px;
-    }
-    
-    .metadata {
-        background-color: #f0f2f6;
-        padding: 15px;
-        border-radius: 8px;
-        margin: 15px 0;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
-        transition: transform 0.2s;
-    }
-
-    .stButton button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.15);
-    }
-
-    /* History Section Styling */
-    .history-card {
-        background-color: white;
-        padding: 15px;
-        border-radius: 8px;
-        margin: 10px 0;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
-    }
-
-    .history-section {
-        padding: 20px;
-        border-radius: 10px;
-        margin: 15px 0;
-        background-color: #f8f9fa;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-    }
-
-    /* Mobile Optimizations */
-    @media (max-width: 768px) {
-        .question-text {
-            font-size: 18px !important;
-            padding: 15px;
-        }
+# OpenDB categories and question counts, refreshed daily in the background
+@st.cache_resource
+def init_catalog():
+    return CategoryCatalog(db_path='question_bank.db', background=True)
 
-        .option-list {
-            font-size: 16px;
-            padding: 10px;
-        }
+# Question pages are rendered in memory; set QUIZ_SCREENSHOT_DIR to also keep copies on disk
+@st.cache_resource
+def init_renderer():
+    return QuestionRenderer(output_dir=os.environ.get("QUIZ_SCREENSHOT_DIR"))
 
-        .metadata {
-            padding: 10px;
-        }
+# Stylesheet is read from disk once per process
+@st.cache_resource
+def load_css():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "style.css"), encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
 
-        .history-section {
-            padding: 15px;
-        }
-    }
-</style>
-""", unsafe_allow_html=True)
+# Set QUIZ_METRICS_PORT to expose Prometheus metrics on /metrics
+@st.cache_resource
+def init_metrics_server():
+    port = os.environ.get("QUIZ_METRICS_PORT")
+    return start_metrics_server(int(port)) if port else None
 
-# Add custom CSS for Footer and Remove White Space
-st.markdown("""
-<style>
-    /* Remove top white block (Streamlit header) */
-    /* 
-    header.css-1avcm0n.edgvbvh3 {
-        display: none !important;
-    }
-    
-    .css-1aumxhk.e1fqkh3o3 {
-        display: none;
-    }
-    */
-
-    /* Remove the Streamlit footer */
-    footer {
-        visibility: hidden;
-        height: 0px !important;
-    }
-
-    /* Custom Footer Styling */
-    .custom-footer {
-        text-align: center;
-        color: gray;
-        margin-top: 2rem;
-        padding-top: 1rem;
-        border-top: 1px solid #ddd;
-        font-size: 0.9rem;
-    }
-
-    /* Center align all main content */
-    .block-container {
-        padding-top: 0rem !important;
-        padding-bottom: 0rem !important;
-        max-width: 700px;
-        margin: 0 auto;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Version of each user's history, shared by every session; a user's cached
+# history pages are dropped by bumping their version rather than clearing all
+@st.cache_resource
+def init_history_versions():
+    return {}
 
-# Update the custom CSS section
-st.markdown("""
-<style>
-    /* Main container styling */
-    .block-container {
-        padding: 2rem 1rem !important;
-        max-width: 800px !important;
-        margin: 0 auto;
-    }
-    
-    /* Clean background */
-    .stApp {
-        background: #f8f9fa;
-    }
-    
-    /* Question card styling */
-    .question-text {
-        font-size: 1.2rem !important;
-        padding: 1.5rem;
-        background-color: white;
-        border-radius: 10px;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.05);
-        margin: 1.5rem 0;
-        border: 1px solid #e9ecef;
-    }
-    
-    /* Metadata styling */
-    .metadata {
-        background-color: white;
-        padding: 1rem;
-        border-radius: 8px;
-        margin: 1rem 0;
-        border: 1px solid #e9ecef;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.05);
-    }
-
-    /* Options styling */
-    .option-list {
-        background: white;
-        padding: 1rem;
-        border-radius: 8px;
-        margin: 1rem 0;
-        border: 1px solid #e9ecef;
-    }
-
-    /* Button styling */
-    .stButton button {
-        width: 100%;
-        border-radius: 6px;
-        padding: 0.5rem 1rem;
-        font-weight: 500;
-        transition: transform 0.2s;
-    }
-
-    /* Custom footer */
-    .custom-footer {
-        position: fixed;
-        bottom: 0;
-        left: 0;
-        right: 0;
-        padding: 1rem;
-        background: white;
-        text-align: center;
-        border-top: 1px solid #e9ecef;
-        z-index: 100;
-    }
-
-    /* History section */
-    .history-section {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        border: 1px solid #e9ecef;
-    }
-
-    .history-card {
-        background: #f8f9fa;
-        padding: 1rem;
-        border-radius: 8px;
-        margin: 1rem 0;
-        border: 1px solid #e9ecef;
-    }
-
-    /* Sidebar improvements */
-    .css-1d391kg {
-        padding: 2rem 1rem;
-    }
-
-    /* Typography improvements */
-    h1, h2, h3, h4, h5, h6 {
-        color: #1a1a1a;
-        margin: 1rem 0;
-    }
-
-    /* Info boxes */
-    .stAlert {
-        background: white;
-        border: 1px solid #e9ecef;
-        border-radius: 8px;
-    }
-
-    /* Add padding at bottom to prevent content being hidden by footer */
-    .main {
-        padding-bottom: 4rem;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Get database instance
+init_metrics_server()
+db = init_db()
+bank = init_bank()
+catalog = init_catalog()
+renderer = init_renderer()
+history_versions = init_history_versions()
+
+# Database calls for this session go through one unit of work; each rerun is a request
+if 'uow' not in st.session_state:
+    st.session_state.uow = UnitOfWork(db)
+uow = st.session_state.uow
+
+# The script body runs as one request; buffered writes are committed when it
+# ends, also when st.rerun or st.stop cut it short
+with uow.request():
+    # History reads are cached per page; the user's version is part of the key,
+    # so their status writes invalidate only their own pages
+    @st.cache_data(ttl=300, show_spinner=False)
+    def load_history_page(history_user_id, version, status, after_id, limit):
+        return uow.get_user_history_page(history_user_id, status, after_id=after_id, limit=limit)
+
+    def invalidate_history(history_user_id):
+        history_versions[history_user_id] = history_versions.get(history_user_id, 0) + 1
+
+    # Category Mapping, loaded from OpenDB through the local catalog
+    try:
+        CATEGORIES = {**catalog.categories(), "Any Category": None}
+    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+        st.sidebar.warning(f"Could not load OpenDB categories: {e}")
+        CATEGORIES = {"Any Category": None}
+
+    # Initialize Session State
+    if 'seen_hashes' not in st.session_state:
+        st.session_state.seen_hashes = set()
+
+    # User Authentication
+    st.sidebar.header("User Authentication")
+    username = st.sidebar.text_input("Enter your username", value="0")
+    if username == "":
+        username = "0"
+
+    # Log in once per session; "0" reviews anonymously
+    if st.session_state.get('username') != username:
+        st.session_state.user_id = None if username == "0" else uow.write('get_or_create_user', username)
+        st.session_state.username = username
+    user_id = st.session_state.user_id
+
+    # The review queue holds only ids and is rebuilt from pending reviews, so a reload keeps it
+    if st.session_state.get('queue_user_id', -1) != user_id:
+        st.session_state.review_queue = ReviewQueue.from_pending(uow, user_id)
+        st.session_state.queue_user_id = user_id
+        st.session_state.pop('prefetcher', None)
+    review_queue = st.session_state.review_queue
+
+    # Sidebar - Reset Database (for testing purposes)
+    if st.sidebar.button("Reset Database"):
+        uow.write('reset_database')
+        renderer.clear()
+        load_history_page.clear()
+        review_queue.clear()
+        st.session_state.pop('username', None)
+        st.sidebar.success("Database reset successfully. Please reload the app.")
+
+    # Sidebar - Selection; category and difficulty sit outside the form so the
+    # question count slider can be capped by what OpenDB holds for them
+    st.sidebar.header("Quiz Parameters")
+    categories = st.sidebar.multiselect("Categories", list(CATEGORIES.keys()), default=["Any Category"])
+    difficulty = st.sidebar.selectbox("Difficulty", ["Any", "Easy", "Medium", "Hard"])
+    selected_categories = [CATEGORIES[name] for name in categories] or [None]
+    selected_difficulty = None if difficulty == "Any" else difficulty.lower()
+    available_counts = [catalog.count(category_id, selected_difficulty) for category_id in selected_categories]
+    max_amount = 49
+    if None not in available_counts:
+        max_amount = min(max_amount, max(available_counts))
+    with st.sidebar.form(key='parameters'):
+        q_type = st.selectbox("Type", ["Any", "Multiple Choice", "True / False"])
+        if max_amount > 1:
+            amount = st.slider("Number of Questions (per category)", 1, max_amount, min(10, max_amount))
+        else:
+            amount = max_amount
+            st.caption("No questions available for this selection." if amount == 0
+                       else "Only one question available for this selection.")
+        prefetch_watermark = st.slider("Prefetch more when fewer than (0 = off)", 0, 20, 3)
+        duplicate_mode = st.selectbox("Near-duplicates of stored questions", ["Link to stored question", "Drop"])
+        submit = st.form_submit_button("Fetch Questions")
+
+    # Fetch Questions
+    if submit:
+        selected_type = None
+        if q_type == "Multiple Choice":
+            selected_type = "multiple"
+        elif q_type == "True / False":
+            selected_type = "boolean"
+
+        # Only send requests that can succeed: cap each at what its category holds
+        specs, skipped = catalog.plan([FetchSpec(category_id, selected_difficulty, selected_type, amount)
+                                       for category_id in dict.fromkeys(selected_categories)])
+        if skipped:
+            names = {category_id: name for name, category_id in CATEGORIES.items()}
+            st.info("No questions available for: " + ", ".join(names.get(spec.category, "Any Category")
+                                                               for spec in skipped))
+        try:
+            wait = default_scheduler.estimated_wait()
+            with st.spinner(f"Fetching questions (about {wait:.0f}s queued)..." if wait >= 1 else "Fetching questions..."):
+                # Skip questions already shown this session or already decided by this user
+                exclude = st.session_state.seen_hashes | uow.get_decided_hashes(user_id)
+                data = OpenDBAPI.fetch_many(specs, bank=bank, exclude=exclude, catalog=catalog)
+            for spec, error in data['errors']:
+                st.error(f"Error fetching questions: {error}")
+            fetched = data.get('results', [])
+            dedup = Deduplicator(db, mode='drop' if duplicate_mode == "Drop" else 'link')
+            questions = dedup.filter(user_id, fetched).questions
+            if len(questions) < len(fetched):
+                st.info(f"Skipped {len(fetched) - len(questions)} duplicate question(s).")
+            st.session_state.seen_hashes.update(question_hash(q) for q in fetched + questions)
+            # Store fetched questions in the database in one transaction and save the history_ids
+            history_ids = uow.write('add_question_history_bulk', user_id, questions)
+            for question, history_id in zip(questions, history_ids):
+                question['history_id'] = history_id  # Store the history_id in the question dict
+            # New questions join the end of the queue and review starts at the first of them
+            added = review_queue.extend(questions)
+            if added:
+                review_queue.seek(added[0])
+            # Keep topping up the queue with the same parameters in the background
+            st.session_state.prefetcher = QueuePrefetcher(
+                db, user_id, specs, bank=bank, watermark=prefetch_watermark,
+                exclude=exclude | st.session_state.seen_hashes, dedup=dedup, catalog=catalog
+            )
+        except (requests.exceptions.RequestException, OpenDBError) as e:
+            st.error(f"Error fetching questions: {e}")
+
+    # Sidebar - Bulk review of every question matching a filter
+    with st.sidebar.expander("Bulk Review"):
+        with st.form(key='bulk_review'):
+            bulk_scope = st.radio("Apply to", ["Current queue", "All my pending questions"])
+            bulk_category = st.selectbox("Category", ["Any"] + [name for name, cid in CATEGORIES.items() if cid])
+            bulk_difficulty = st.selectbox("Difficulty", ["Any", "Easy", "Medium", "Hard"])
+            bulk_type = st.selectbox("Type", ["Any", "Multiple Choice", "True / False"])
+            accept_col, reject_col = st.columns(2)
+            with accept_col:
+                bulk_accept = st.form_submit_button("✅ Accept all")
+            with reject_col:
+                bulk_reject = st.form_submit_button("❌ Reject all")
+
+    if bulk_accept or bulk_reject:
+        bulk_status = "accepted" if bulk_accept else "rejected"
+        bulk_filter = {
+            'category': None if bulk_category == "Any" else bulk_category,
+            'difficulty': None if bulk_difficulty == "Any" else bulk_difficulty.lower(),
+            'type': {"Multiple Choice": "multiple", "True / False": "boolean"}.get(bulk_type),
+        }
 
-# Display Questions
-if st.session_state.questions:
-    question = st.session_state.questions[st.session_state.current_question]
-    
-    # Metadata section
-    st.markdown("""
-    <div class="metadata">
-        <b>Category:</b> {} <br>
-        <b>Type:</b> {} <br>
-        <b>Difficulty:</b> {}
-    </div>
-    """.format(
-        question.get('category'),
-        question.get('type').capitalize(),
-        question.get('difficulty').capitalize()
-    ), unsafe_allow_html=True)
-    
-    # Question section
-    st.markdown('<div class="question-text">{}</div>'.format(question['question']), unsafe_allow_html=True)
-    
-    # Options section
-    options = question.get('incorrect_answers', []) + [question.get('correct_answer')]
-    if question.get('type') == 'boolean':
-        options = ["True", "False"]
-    
-    st.markdown("### Options")
-    option_text = ""
-    for idx, option in enumerate(options):
-        option_text += f"{chr(97+idx)}) {option}<br>"
-    st.markdown(f'<div class="option-list">{option_text}</div>', unsafe_allow_html=True)
+        def matches_bulk_filter(q):
+            return all(value is None or q.get(key) == value for key, value in bulk_filter.items())
+
+        matched_ids = [q['history_id'] for q in review_queue.questions() if matches_bulk_filter(q)]
+        if bulk_scope == "Current queue":
+            updated = uow.write('update_question_status_bulk', matched_ids, bulk_status)
+        else:
+            updated = uow.write('update_status_by_filter', user_id, bulk_status, from_status="pending",
+                                category=bulk_filter['category'],
+                                question_type=bulk_filter['type'],
+                                difficulty=bulk_filter['difficulty'])
+        invalidate_history(user_id)
+        # Matching questions in the queue have been decided either way
+        for history_id in matched_ids:
+            review_queue.remove(history_id)
+        st.sidebar.success(f"Marked {updated} question(s) as {bulk_status}.")
+
+    # Sidebar - Full-text search over reviewed questions
+    with st.sidebar.expander("Search"):
+        search_text = st.text_input("Search questions and answers", key="search_text")
+        search_status = st.selectbox("Status", ["Any", "Accepted", "Rejected", "Pending"], key="search_status")
+        search_difficulty = st.selectbox("Difficulty", ["Any", "Easy", "Medium", "Hard"], key="search_difficulty")
+        search_all = st.checkbox("All users", key="search_all")
+        if search_text:
+            search_results = uow.search_questions(
+                search_text, user_id, all_users=search_all,
+                status=None if search_status == "Any" else search_status.lower(),
+                difficulty=None if search_difficulty == "Any" else search_difficulty.lower(),
+            )
+            if not search_results:
+                st.info("No matching questions.")
+            for result in search_results:
+                st.markdown(f"**{result['question']}**")
+                st.caption(f"{result['correct_answer']} · {result['category']} · {result['status']}"
+                           + (f" · {result['username']}" if search_all and result['username'] else ""))
+
+    # Add custom CSS
+    st.markdown(load_css(), unsafe_allow_html=True)
+
+    def review_current_question(status):
+        question = review_queue.current()
+        uow.update_question_status(question['history_id'], status)
+        invalidate_history(user_id)
+        st.session_state.last_accepted = question if status == "accepted" else None
+        review_queue.remove(question['history_id'])
+        # st.rerun is a no-op inside callbacks, so the fragment asks for a full rerun
+        st.session_state.history_stale = True
+
+    def move_question(step):
+        review_queue.move(step)
+
+    # Display Questions; navigation and review only rerun this fragment
+    @st.fragment
+    @uow.scoped
+    def question_panel():
+        # A review changed the history pages, which live outside this fragment
+        if st.session_state.pop('history_stale', False) and st.session_state.get('show_history'):
+            st.rerun(scope="app")
+
+        prefetcher = st.session_state.get('prefetcher')
+        if prefetcher is not None:
+            prefetcher.maybe_prefetch(len(review_queue))
+            if not review_queue and prefetcher.running:
+                with st.spinner("Fetching more questions..."):
+                    prefetcher.wait()
+            prefetched = prefetcher.drain()
+            review_queue.extend(prefetched)
+            st.session_state.seen_hashes.update(question_hash(q) for q in prefetched)
+            if prefetcher.error is not None:
+                st.warning(f"Background fetch failed: {prefetcher.error}")
+
+        question = review_queue.current()
+        if question is not None:
+        
+            # Metadata section
+            st.markdown("""
+            <div class="metadata">
+                <b>Category:</b> {} <br>
+                <b>Type:</b> {} <br>
+                <b>Difficulty:</b> {}
+            </div>
+            """.format(
+                question.get('category'),
+                question.get('type').capitalize(),
+                question.get('difficulty').capitalize()
+            ), unsafe_allow_html=True)
+        
+            # Question section
+            st.markdown('<div class="question-text">{}</div>'.format(question['question']), unsafe_allow_html=True)
+        
+            # Options section
+            options = question_options(question)
+        
+            st.markdown("### Options")
+            option_text = ""
+            for idx, option in enumerate(options):
+                option_text += f"{chr(97+idx)}) {option}<br>"
+            st.markdown(f'<div class="option-list">{option_text}</div>', unsafe_allow_html=True)
+        
+            # Answer section
+            st.info(f"**Answer:** {question['correct_answer']}")
+        
+            # Navigation buttons
+            col1, col2, col3 = st.columns([1, 1, 1])
+            with col1:
+                st.button("⬅️ Previous", key="previous", width="stretch",
+                          on_click=move_question, args=(-1,))
+            with col2:
+                st.button("❌ Reject", key="reject", width="stretch",
+                          on_click=review_current_question, args=("rejected",))
+            with col3:
+                st.button("✅ Accept", key="accept", width="stretch",
+                          on_click=review_current_question, args=("accepted",))
+                    
+            # Next button in a separate row for better mobile layout
+            st.button("➡️ Next", key="next", width="stretch", on_click=move_question, args=(1,))
+        else:
+            st.info("No questions available. Please fetch questions to start the quiz.")
+
+        last_accepted = st.session_state.get('last_accepted')
+        if last_accepted:
+            # Render the question page in memory; cached for the history view
+            st.download_button(
+                label="Download Question Details",
+                data=renderer.render(last_accepted['history_id'], last_accepted),
+                file_name=renderer.file_name(last_accepted['history_id']),
+                mime="text/html"
+            )
+
+    question_panel()
+
+    # Enhanced History Section
+    HISTORY_PAGE_SIZE = 10
+
+    if 'show_history' not in st.session_state:
+        st.session_state.show_history = False
+    if 'history_cursors' not in st.session_state:
+        # Stack of page-start cursors per status, used for keyset pagination
+        st.session_state.history_cursors = {"rejected": [0], "accepted": [0]}
+
+    def history_page(status):
+        cursors = st.session_state.history_cursors[status]
+        # Fetch one extra row to know whether a next page exists
+        rows = load_history_page(user_id, history_versions.get(user_id, 0), status, cursors[-1],
+                                 HISTORY_PAGE_SIZE + 1)
+        return rows[:HISTORY_PAGE_SIZE], len(rows) > HISTORY_PAGE_SIZE
+
+    def history_pager(status, rows, has_next):
+        cursors = st.session_state.history_cursors[status]
+        prev_col, next_col = st.columns(2)
+        with prev_col:
+            st.button("⬅️ Prev", key=f"{status}_prev", disabled=len(cursors) == 1, width="stretch",
+                      on_click=cursors.pop)
+        with next_col:
+            st.button("Next ➡️", key=f"{status}_next", disabled=not has_next, width="stretch",
+                      on_click=cursors.append, args=(rows[-1]['id'] if rows else 0,))
+
+    def set_history_status(history_id, status):
+        uow.update_question_status(history_id, status)
+        if status != "accepted":
+            renderer.invalidate(history_id)
+        invalidate_history(user_id)
+
+    @st.fragment
+    @uow.scoped
+    def history_panel():
+        col1, col2 = st.columns(2)
     
-    # Answer section
-    st.info(f"**Answer:** {question['correct_answer']}")
+        with col1:
+            st.markdown('<div class="history-section">', unsafe_allow_html=True)
+            st.subheader("❌ Rejected Questions")
+            rejected_questions, has_next = history_page("rejected")
+            for q in rejected_questions:
+                st.markdown('<div class="history-card">', unsafe_allow_html=True)
+                st.write(f"📌 **Category:** {q.get('category')}")
+                st.write(q['question'])
+                st.write(f"💡 **Answer:** {q['correct_answer']}")
+                st.button("✅ Undo", key=f"undo_{q['id']}",
+                          on_click=set_history_status, args=(q['id'], "accepted"))  # Use the history_id
+                st.markdown('</div>', unsafe_allow_html=True)
+            history_pager("rejected", rejected_questions, has_next)
+            st.markdown('</div>', unsafe_allow_html=True)
     
-    # Navigation buttons
-    col1, col2, col3 = st.columns([1, 1, 1])
-    with col1:
-        if st.button("⬅️ Previous", key="previous", use_container_width=True) and st.session_state.current_question > 0:
-            st.session_state.current_question -= 1
-    with col2:
-        if st.button("❌ Reject", key="reject", use_container_width=True):
-            db.update_question_status(question['history_id'], "rejected")
-            st.write(f"Debug: Rejected Question - {question['question']}")  # Debug statement
-            st.session_state.questions.pop(st.session_state.current_question)
-            if st.session_state.current_question >= len(st.session_state.questions):
-                st.session_state.current_question = max(0, len(st.session_state.questions) - 1)
-    with col3:
-        if st.button("✅ Accept", key="accept", use_container_width=True):
-            db.update_question_status(question['history_id'], "accepted")
-            
-            # Create HTML content with styling
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .container {{ max-width: 800px; margin: auto; padding: 20px; border: 1px solid #ddd; border-radius: 8px; }}
-                .metadata {{ background-color: #f5f5f5; padding: 10px; border-radius: 5px; margin: 10px 0; }}
-                .question {{ font-size: 18px; margin: 15px 0; }}
-                .answer {{ color: #2e7d32; font-weight: bold; }}
-                .timestamp {{ color: #666; font-size: 12px; margin-top: 20px; }}
-            </style>
-            </head>
-            <body>
-            <div class="container">
-                <div class="metadata">
-                    <strong>Category:</strong> {html.escape(question.get('category', ''))}<br>
-                    <strong>Difficulty:</strong> {html.escape(question.get('difficulty', '').capitalize())}<br>
-                    <strong>Type:</strong> {html.escape(question.get('type', '').capitalize())}
-                </div>
-                <div class="question">
-                    <strong>Question:</strong> {html.escape(question['question'])}
-                </div>
-                <div class="answer">
-                    <strong>Correct Answer:</strong> {html.escape(question['correct_answer'])}
-                </div>
-                <div class="options">
-                    <strong>Options:</strong>
-                    <ul>
-                        {''.join([f"<li>{html.escape(opt)}</li>" for opt in options])}
-                    </ul>
-                </div>
-                <div class="timestamp">
-                    Captured on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-                </div>
-            </div>
-            </body>
-            </html>
-            """
-            
-            # Save HTML file
-            screenshot_dir = "screenshots"
-            os.makedirs(screenshot_dir, exist_ok=True)
-            html_path = os.path.join(screenshot_dir, f"question_{question['history_id']}.html")
-            
-            with open(html_path, "w", encoding='utf-8') as f:
-                f.write(html_content)
-            
-            # Create download button for HTML
-            with open(html_path, "rb") as file:
+        with col2:
+            st.markdown('<div class="history-section">', unsafe_allow_html=True)
+            st.subheader("✅ Accepted Questions")
+            accepted_questions, has_next = history_page("accepted")
+            for q in accepted_questions:
+                st.markdown('<div class="history-card">', unsafe_allow_html=True)
+                st.write(f"📌 **Category:** {q.get('category')}")
+                st.write(q['question'])
+                st.write(f"💡 **Answer:** {q['correct_answer']}")
                 st.download_button(
                     label="Download Question Details",
-                    data=file,
-                    file_name=f"question_{question['history_id']}.html",
-                    mime="text/html"
+                    data=functools.partial(renderer.render, q['id'], q),  # Rendered only when clicked
+                    file_name=renderer.file_name(q['id']),
+                    mime="text/html",
+                    key=f"download_{q['id']}"
                 )
-                
-            st.session_state.questions.pop(st.session_state.current_question)
-            if st.session_state.current_question >= len(st.session_state.questions):
-                st.session_state.current_question = max(0, len(st.session_state.questions) - 1)
-                
-    # Next button in a separate row for better mobile layout
-    if st.button("➡️ Next", key="next", use_container_width=True) and st.session_state.current_question < len(st.session_state.questions) - 1:
-        st.session_state.current_question += 1
-else:
-    st.info("No questions available. Please fetch questions to start the quiz.")
-
-# Enhanced History Section
-st.sidebar.header("History")
-if st.sidebar.button("Show History"):
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown('<div class="history-section">', unsafe_allow_html=True)
-        st.subheader("❌ Rejected Questions")
-        rejected_questions = db.get_user_history_by_status(user_id, "rejected")
-        st.write(f"Debug: Rejected Questions - {rejected_questions}")  # Debug statement
-        for q in rejected_questions:
-            st.markdown('<div class="history-card">', unsafe_allow_html=True)
-            st.write(f"📌 **Category:** {q.get('category')}")
-            st.write(q['question'])
-            st.write(f"💡 **Answer:** {q['correct_answer']}")
-            if st.button("✅ Undo", key=f"undo_{q['id']}"):
-                db.update_question_status(q['id'], "accepted")  # Use the history_id
-                st.rerun()
+                st.button("❌ Remove", key=f"remove_{q['id']}",
+                          on_click=set_history_status, args=(q['id'], "rejected"))
+                st.markdown('</div>', unsafe_allow_html=True)
+            history_pager("accepted", accepted_questions, has_next)
             st.markdown('</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown('<div class="history-section">', unsafe_allow_html=True)
-        st.subheader("✅ Accepted Questions")
-        accepted_questions = db.get_user_history_by_status(user_id, "accepted")
-        st.write(f"Debug: Accepted Questions - {accepted_questions}")  # Debug statement
-        for q in accepted_questions:
-            st.markdown('<div class="history-card">', unsafe_allow_html=True)
-            st.write(f"📌 **Category:** {q.get('category')}")
-            st.write(q['question'])
-            st.write(f"💡 **Answer:** {q['correct_answer']}")
-            html_path = f"screenshots/question_{q['id']}.html"
-            if os.path.exists(html_path):
-                with open(html_path, "rb") as file:
-                    st.download_button(
-                        label="Download Question Details",
-                        data=file,
-                        file_name=f"question_{q['id']}.html",
-                        mime="text/html",
-                        key=f"download_{q['id']}"
-                    )
-            if st.button("❌ Remove", key=f"remove_{q['id']}"):
-                db.update_question_status(q['id'], "rejected")
-                if os.path.exists(html_path):
-                    os.remove(html_path)
-                st.rerun()
-            st.markdown('</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+
+    st.sidebar.header("History")
+    if st.sidebar.button("Hide History" if st.session_state.show_history else "Show History"):
+        st.session_state.show_history = not st.session_state.show_history
+        st.session_state.history_cursors = {"rejected": [0], "accepted": [0]}
+    if st.session_state.show_history:
+        history_panel()
+
+    # Sidebar - Export accepted questions
+    EXPORT_EXTENSIONS = {'jsonl': 'jsonl', 'csv': 'csv', 'html-zip': 'zip'}
+
+    def build_export(fmt, all_users, export_user_id):
+        buffer = io.BytesIO()
+        export_questions(db, fmt, buffer, user_id=export_user_id, all_users=all_users)
+        return buffer.getvalue()
+
+    with st.sidebar.expander("Export"):
+        export_format = st.selectbox("Format", list(EXPORT_EXTENSIONS), key="export_format")
+        export_all = st.checkbox("All users", key="export_all")
+        st.download_button(
+            label="Download accepted questions",
+            data=functools.partial(build_export, export_format, export_all, user_id),  # Built only when clicked
+            file_name=f"accepted_questions.{EXPORT_EXTENSIONS[export_format]}",
+            mime=EXPORT_MIME_TYPES[export_format],
+            key="export_download"
+        )
+
+    # Sidebar - Performance metrics for admins
+    with st.sidebar.expander("Performance"):
+        # The threshold is process-wide, so it only changes when explicitly applied
+        with st.form(key="slow_threshold"):
+            slow_threshold = st.number_input("Slow call threshold (ms)", min_value=1.0,
+                                             value=float(metrics.slow_threshold_ms))
+            if st.form_submit_button("Apply to all sessions"):
+                metrics.slow_threshold_ms = slow_threshold
+        if uow.last_round_trips is not None:
+            st.caption(f"Database round trips in the last rerun: {uow.last_round_trips}")
+        st.dataframe(metrics.snapshot(), width="stretch")
+        st.download_button(
+            label="Download metrics",
+            data=metrics.render_prometheus,
+            file_name="quiz_metrics.prom",
+            mime="text/plain",
+            key="metrics_download"
+        )
+        if st.button("Reset metrics", key="metrics_reset"):
+            metrics.reset()
 
 # Footer
 st.markdown("""
@@ -548,8 +480,6 @@ st.markdown("""
 
 # Update the shutdown handler
 def shutdown():
-    db.release_connection()  # Ensure connection is released
-    db.close()
-    st.session_state.db_initialized = False
+    db.close()  # Commits any queued writes before the writer thread exits
 
 atexit.register(shutdown)
\ No newline at end of file
@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.common import measure
+from utils.api import FetchSpec, OpenDBAPI, QuestionBank, RequestScheduler
+
+_question_ids = count()
+
+
+class _StubOpenDBHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so the client's pooled keep-alive connections are exercised
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        amount = int(params.get('amount', ['10'])[0])
+        results = []
+        for _ in range(amount):
+            n = next(_question_ids)
+            results.append({
+                'type': 'multiple',
+                'difficulty': 'easy',
+                'category': 'General Knowledge',
+                'question': f"Stub question &quot;{n}&quot;?",
+                'correct_answer': f"Answer &amp; {n}",
+                'incorrect_answers': [f"Wrong {n}-{i}" for i in range(3)],
+            })
+        body = json.dumps({'response_code': 0, 'results': results}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_api_benchmarks(workdir: str, repeat: int = 50) -> List[Dict]:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubOpenDBHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    class StubAPI(OpenDBAPI):
+        BASE_URL = f"http://127.0.0.1:{server.server_address[1]}/api.php"
+
+    # Effectively unlimited bucket: this measures client overhead, not OpenDB's rate limit
+    scheduler = RequestScheduler(interval=1e-9, burst=10 ** 9)
+    bank_path = os.path.join(workdir, "bench_bank.db")
+    if os.path.exists(bank_path):
+        os.remove(bank_path)
+    bank = QuestionBank(db_path=bank_path)
+    results = []
+    try:
+        results.append(measure('fetch_questions[network]',
+                               lambda i: StubAPI(amount=50, scheduler=scheduler).fetch_questions(),
+                               repeat))
+        StubAPI(amount=50, bank=bank, scheduler=scheduler).fetch_questions()
+        results.append(measure('fetch_questions[bank]',
+                               lambda i: StubAPI(amount=50, bank=bank, scheduler=scheduler).fetch_questions(),
+                               repeat))
+        specs = [FetchSpec(category, None, None, 10) for category in (9, 17, 22, 23)]
+        results.append(measure('fetch_many[4 specs]',
+                               lambda i: StubAPI.fetch_many(specs, scheduler=scheduler),
+                               max(1, repeat // 5)))
+    finally:
+        bank.close()
+        server.shutdown()
+        server.server_close()
+    return results
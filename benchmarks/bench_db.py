@@ -0,0 +1,153 @@
+import itertools
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+from benchmarks.common import measure, summarize
+from utils.api import question_hash
+from utils.db import Database
+from utils.dedup import Deduplicator
+
+CATEGORIES = ["General Knowledge", "History", "Geography", "Science & Nature", "Sports"]
+DIFFICULTIES = ["easy", "medium", "hard"]
+STATUSES = ["pending", "accepted", "rejected"]
+SEED_BATCH = 10000
+
+
+def _pseudo_words(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 10)))
+            for _ in range(count)]
+
+
+# Question text is drawn from a large vocabulary so MinHash bands spread over
+# the corpus the way real questions do
+WORDS = _pseudo_words(5000)
+
+def synthetic_question(i: int) -> Dict:
+    words = random.Random(i).choices(WORDS, k=10)
+    return {
+        'question': f"{' '.join(words).capitalize()}?",
+        'category': CATEGORIES[i % len(CATEGORIES)],
+        'type': 'boolean' if i % 3 == 0 else 'multiple',
+        'difficulty': DIFFICULTIES[i % len(DIFFICULTIES)],
+        'correct_answer': f"Answer {i}",
+        'incorrect_answers': [f"Wrong {i}-{n}" for n in range(3)],
+    }
+
+
+def seed_database(path: str, rows: int, users: int = 50):
+    # Schema comes from the real migrations; rows are bulk-loaded directly for
+    # speed, inside bulk_load so the MinHash band index is built for them too
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db = Database(db_path=path)
+    for user in range(users):
+        db.add_user(f"bench_user_{user}")
+
+    rng = random.Random(rows)
+    with db.bulk_load():
+        conn = sqlite3.connect(path)
+        for start in range(0, rows, SEED_BATCH):
+            batch = range(start, min(rows, start + SEED_BATCH))
+            questions = [synthetic_question(i) for i in batch]
+            conn.executemany("""
+                INSERT INTO questions (id, hash, question, category, type, difficulty, correct_answer,
+                                       incorrect_answers)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(i + 1, question_hash(q), q['question'], q['category'], q['type'], q['difficulty'],
+                   q['correct_answer'], json.dumps(q['incorrect_answers'])) for i, q in zip(batch, questions)])
+            conn.executemany("INSERT INTO reviews (id, user_id, question_id, status) VALUES (?, ?, ?, ?)",
+                             [(i + 1, i % users + 1, i + 1, rng.choice(STATUSES)) for i in batch])
+            conn.commit()
+        conn.close()
+    db.close()
+
+
+def dedup_batch(rng: random.Random, rows: int, fresh, size: int = 49) -> List[Dict]:
+    # A fetch-sized batch: a third new, a third exact repeats, a third rephrased repeats
+    batch = []
+    for n in range(size):
+        if n % 3 == 0:
+            batch.append(synthetic_question(next(fresh)))
+            continue
+        question = synthetic_question(rng.randrange(rows))
+        if n % 3 == 2:
+            question['question'] = question['question'][:-1] + " exactly?"
+        batch.append(question)
+    return batch
+
+
+def _concurrent_updates(db: Database, rows: int, threads: int, per_thread: int) -> Dict:
+    rng = random.Random(threads)
+    timings = []
+    lock = threading.Lock()
+
+    def worker(ids):
+        local = []
+        for history_id in ids:
+            start = time.perf_counter()
+            db.update_question_status(history_id, rng.choice(STATUSES[1:]))
+            local.append(time.perf_counter() - start)
+        with lock:
+            timings.extend(local)
+
+    workers = [threading.Thread(target=worker, args=([rng.randint(1, rows) for _ in range(per_thread)],))
+               for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    wall = time.perf_counter() - start
+    result = summarize('concurrent_update_question_status', timings, rows=rows, threads=threads)
+    result['wall_seconds'] = round(wall, 6)
+    result['ops_per_sec'] = round(len(timings) / wall, 2)
+    return result
+
+
+def run_db_benchmarks(sizes: List[int], workdir: str, repeat: int = 200, threads: int = 8) -> List[Dict]:
+    results = []
+    for rows in sizes:
+        path = os.path.join(workdir, f"bench_{rows}.db")
+        seed_database(path, rows)
+        rng = random.Random(rows)
+        fresh = itertools.count(rows)
+        user_id = 1
+
+        db = Database(db_path=path)
+        results.append(measure('add_question_history',
+                               lambda i: db.add_question_history(user_id, synthetic_question(next(fresh))),
+                               repeat, rows=rows))
+        results.append(measure('add_question_history_bulk[49]',
+                               lambda i: db.add_question_history_bulk(
+                                   user_id, [synthetic_question(next(fresh)) for _ in range(49)]),
+                               max(1, repeat // 10), rows=rows))
+        results.append(measure('update_question_status',
+                               lambda i: db.update_question_status(rng.randint(1, rows), 'accepted'),
+                               repeat, rows=rows))
+        results.append(measure('get_user_history_by_status',
+                               lambda i: db.get_user_history_by_status(user_id, 'accepted'),
+                               max(1, repeat // 20), rows=rows))
+        results.append(measure('get_user_history_page',
+                               lambda i: db.get_user_history_page(user_id, 'accepted', limit=20),
+                               repeat, rows=rows))
+        results.append(_concurrent_updates(db, rows, threads, max(1, repeat // threads)))
+        dedup = Deduplicator(db)
+        results.append(measure('dedup_filter[49]',
+                               lambda i: dedup.filter(user_id, dedup_batch(rng, rows, fresh)),
+                               max(1, repeat // 10), rows=rows))
+        db.close()
+
+        db = Database(db_path=path, write_behind=True)
+        results.append(measure('update_question_status[write_behind]',
+                               lambda i: db.update_question_status(rng.randint(1, rows), 'rejected'),
+                               repeat, rows=rows))
+        results.append(measure('flush[write_behind]', lambda i: db.flush(), 1, rows=rows))
+        db.close()
+    return results
@@ -0,0 +1,27 @@
+import statistics
+import time
+from typing import Callable, Dict, List
+
+
+def summarize(name: str, timings: List[float], **meta) -> Dict:
+    # timings are per-operation wall-clock seconds
+    ordered = sorted(timings)
+    total = sum(ordered)
+    return dict(meta, **{
+        'name': name,
+        'ops': len(ordered),
+        'seconds': round(total, 6),
+        'ops_per_sec': round(len(ordered) / total, 2) if total else None,
+        'p50_ms': round(statistics.median(ordered) * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    })
+
+
+def measure(name: str, fn: Callable[[int], None], repeat: int, **meta) -> Dict:
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - start)
+    return summarize(name, timings, **meta)
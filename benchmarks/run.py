@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_api import run_api_benchmarks
+from benchmarks.bench_db import run_db_benchmarks
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+
+
+def check_thresholds(results, thresholds):
+    # thresholds.json maps a benchmark name to limits on its metrics,
+    # e.g. {"update_question_status": {"p95_ms": 50}}; *_ms are maxima, ops_per_sec a minimum
+    failures = []
+    for result in results:
+        for metric, limit in thresholds.get(result['name'], {}).items():
+            value = result.get(metric)
+            if value is None:
+                continue
+            too_slow = value < limit if metric == 'ops_per_sec' else value > limit
+            if too_slow:
+                failures.append(f"{result['name']} (rows={result.get('rows', '-')}): {metric}={value} breaks limit {limit}")
+    return failures
+
+
+def check_baseline(results, baseline, tolerance):
+    failures = []
+    previous = {(r['name'], r.get('rows')): r for r in baseline.get('results', [])}
+    for result in results:
+        before = previous.get((result['name'], result.get('rows')))
+        if not before or not before.get('p95_ms'):
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            failures.append(f"{result['name']} (rows={result.get('rows', '-')}): p95_ms {before['p95_ms']} -> "
+                            f"{result['p95_ms']} exceeds {tolerance:.0%} tolerance")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Database and OpenDBAPI hot paths.")
+    parser.add_argument('--sizes', default='10000,100000',
+                        help="Comma-separated history row counts to seed (e.g. 10000,100000,1000000)")
+    parser.add_argument('--repeat', type=int, default=200, help="Operations per benchmark")
+    parser.add_argument('--threads', type=int, default=8, help="Writer threads for the concurrency benchmark")
+    parser.add_argument('--skip-db', action='store_true')
+    parser.add_argument('--skip-api', action='store_true')
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS, help="JSON file of absolute limits")
+    parser.add_argument('--baseline', help="Previous results JSON to compare p95 latencies against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p95 slowdown versus the baseline")
+    parser.add_argument('--workdir', help="Directory for the seeded databases (default: a temp dir)")
+    parser.add_argument('-o', '--output', help="Write results JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="quiz-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    if not args.skip_db:
+        sizes = [int(size) for size in args.sizes.split(',') if size]
+        results += run_db_benchmarks(sizes, workdir, repeat=args.repeat, threads=args.threads)
+    if not args.skip_api:
+        results += run_api_benchmarks(workdir, repeat=max(1, args.repeat // 4))
+
+    regressions = []
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds, encoding='utf-8') as f:
+            regressions += check_thresholds(results, json.load(f))
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions += check_baseline(results, json.load(f), args.tolerance)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'results': results,
+        'regressions': regressions,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    for failure in regressions:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,42 +1,613 @@
 import requests
 import html
+import copy
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils.metrics import metrics
+
+FetchSpec = namedtuple('FetchSpec', ['category', 'difficulty', 'question_type', 'amount'])
+
+
+def decode_question(question):
+    # OpenDB HTML-escapes text fields; decode them in place
+    if question.get('category'):
+        question['category'] = html.unescape(question['category'])
+    question['question'] = html.unescape(question['question'])
+    question['correct_answer'] = html.unescape(question['correct_answer'])
+    question['incorrect_answers'] = [html.unescape(answer) for answer in question['incorrect_answers']]
+    return question
+
+
+def question_hash(question):
+    # Content hash used to recognise the same OpenDB question across fetches
+    parts = (
+        question.get('type') or '',
+        question.get('question') or '',
+        question.get('correct_answer') or '',
+    )
+    normalized = "\x1f".join(" ".join(part.split()).casefold() for part in parts)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+class QuestionBank:
+    """Local SQLite cache of decoded OpenDB questions, keyed by content hash."""
+
+    def __init__(self, db_path='question_bank.db', ttl=7 * 24 * 3600, max_size=20000):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS bank (
+                hash TEXT PRIMARY KEY,
+                category_id INTEGER,
+                difficulty TEXT,
+                type TEXT,
+                payload TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_bank_lookup
+            ON bank (category_id, difficulty, type, fetched_at)
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_bank_fetched_at ON bank (fetched_at)")
+        self._conn.commit()
+
+    @metrics.timed("bank.get")
+    def get(self, amount, category=None, difficulty=None, question_type=None, exclude=()):
+        query = "SELECT hash, payload FROM bank WHERE fetched_at >= ?"
+        params = [time.time() - self.ttl]
+        if category:
+            query += " AND category_id = ?"
+            params.append(category)
+        if difficulty:
+            query += " AND difficulty = ?"
+            params.append(difficulty)
+        if question_type:
+            query += " AND type = ?"
+            params.append(question_type)
+        query += " ORDER BY fetched_at"
+
+        questions = []
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            for row_hash, payload in cursor:
+                if row_hash in exclude:
+                    continue
+                questions.append(json.loads(payload))
+                if len(questions) >= amount:
+                    break
+            cursor.close()
+        return questions
+
+    @metrics.timed("bank.add")
+    def add(self, questions, category=None):
+        now = time.time()
+        rows = [(
+            question_hash(question),
+            category,
+            question.get('difficulty'),
+            question.get('type'),
+            json.dumps(question),
+            now,
+        ) for question in questions]
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO bank (hash, category_id, difficulty, type, payload, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(hash) DO UPDATE SET
+                    category_id = COALESCE(excluded.category_id, bank.category_id),
+                    fetched_at = excluded.fetched_at
+            """, rows)
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM bank WHERE fetched_at < ?", (now - self.ttl,))
+        overflow = self._conn.execute("SELECT COUNT(*) FROM bank").fetchone()[0] - self.max_size
+        if overflow > 0:
+            self._conn.execute("""
+                DELETE FROM bank WHERE hash IN (
+                    SELECT hash FROM bank ORDER BY fetched_at LIMIT ?
+                )
+            """, (overflow,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM bank")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class OpenDBError(Exception):
+    MESSAGES = {
+        1: "Not enough questions for the requested parameters",
+        2: "Invalid parameter",
+        3: "Session token not found",
+        4: "Session token has returned every available question",
+        5: "Rate limit exceeded",
+    }
+
+    def __init__(self, response_code):
+        self.response_code = response_code
+        super().__init__(self.MESSAGES.get(response_code, f"Unexpected response code {response_code}"))
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestScheduler:
+    """Process-wide token bucket for OpenDB that coalesces identical in-flight requests."""
+
+    def __init__(self, interval=5.0, burst=1, max_retries=3, timeout=10, pool_size=8):
+        self.interval = interval
+        self.burst = burst
+        self.max_retries = max_retries
+        self.timeout = timeout
+        # One keep-alive session for the whole process; transport errors and 5xx
+        # responses are retried with exponential backoff. 429s are left to _perform
+        # so rate-limited retries book a slot with the scheduler like any other call
+        self.session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=('GET',))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._in_flight = {}
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) / self.interval)
+        self._updated = now
+
+    def estimated_wait(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (1 - self._tokens) * self.interval)
+
+    def reserve(self):
+        # Tokens may go negative: each caller books the next free slot and
+        # learns up front how long it has to wait for it
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return max(0.0, -self._tokens * self.interval)
+
+    def get_json(self, url, params, coalesce=True):
+        key = (url, tuple(sorted(params.items())))
+        with self._lock:
+            call = self._in_flight.get(key) if coalesce else None
+            leader = call is None
+            if leader:
+                call = _Call()
+                if coalesce:
+                    self._in_flight[key] = call
+
+        if not leader:
+            metrics.increment("quiz_opendb_coalesced_total")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = self._perform(url, params)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is call:
+                    del self._in_flight[key]
+            call.event.set()
+        return copy.deepcopy(call.result) if coalesce else call.result
+
+    def _perform(self, url, params):
+        for attempt in range(self.max_retries + 1):
+            wait = self.reserve()
+            metrics.observe("quiz_opendb_queue_wait_ms", wait * 1000)
+            time.sleep(wait)
+            start = time.perf_counter()
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            metrics.observe("quiz_opendb_request_ms", (time.perf_counter() - start) * 1000)
+            if response.status_code == 429:
+                # OpenDB's HTTP rate limit means the same as response code 5
+                data = {'response_code': 5, 'results': []}
+                metrics.increment("quiz_opendb_responses_total", code=5)
+                continue
+            response.raise_for_status()
+            data = response.json()
+            metrics.increment("quiz_opendb_responses_total", code=data.get('response_code'))
+            if data.get('response_code') != 5:
+                break
+        return data
+
+
+default_scheduler = RequestScheduler()
+
 
 class OpenDBAPI:
     BASE_URL = "https://opentdb.com/api.php"
+    TOKEN_URL = "https://opentdb.com/api_token.php"
+    CATEGORY_URL = "https://opentdb.com/api_category.php"
+    COUNT_URL = "https://opentdb.com/api_count.php"
+    GLOBAL_COUNT_URL = "https://opentdb.com/api_count_global.php"
+    MAX_AMOUNT = 50
 
-    def __init__(self, amount=10, category=None, difficulty=None, question_type=None):
+    def __init__(self, amount=10, category=None, difficulty=None, question_type=None, bank=None,
+                 scheduler=None, catalog=None):
         self.amount = amount
         self.category = category
         self.difficulty = difficulty
         self.question_type = question_type
+        self.bank = bank
+        self.scheduler = scheduler or default_scheduler
+        self.catalog = catalog
+        self.token = None
+
+    @classmethod
+    def fetch_categories(cls, scheduler=None):
+        data = (scheduler or default_scheduler).get_json(cls.CATEGORY_URL, {})
+        return {html.unescape(category['name']): category['id'] for category in data['trivia_categories']}
+
+    @classmethod
+    def fetch_question_counts(cls, category, scheduler=None):
+        # Verified questions in one category, in total and per difficulty
+        data = (scheduler or default_scheduler).get_json(cls.COUNT_URL, {'category': category})
+        counts = data['category_question_count']
+        return {
+            None: counts['total_question_count'],
+            'easy': counts['total_easy_question_count'],
+            'medium': counts['total_medium_question_count'],
+            'hard': counts['total_hard_question_count'],
+        }
+
+    @classmethod
+    def fetch_global_counts(cls, scheduler=None):
+        # Verified totals per category id in one call; None holds the overall total
+        data = (scheduler or default_scheduler).get_json(cls.GLOBAL_COUNT_URL, {})
+        counts = {int(category): entry['total_num_of_verified_questions']
+                  for category, entry in data['categories'].items()}
+        counts[None] = data['overall']['total_num_of_verified_questions']
+        return counts
 
-    def _build_params(self):
-        params = {'amount': self.amount}
+    def available(self):
+        # Questions OpenDB holds for this category and difficulty, or None if unknown.
+        # Counts are not split by type, so with a type filter this is an upper bound
+        if self.catalog is None:
+            return None
+        return self.catalog.count(self.category, self.difficulty)
+
+    def _build_params(self, amount=None, token=None):
+        params = {'amount': amount or self.amount}
         if self.category:
             params['category'] = self.category
         if self.difficulty:
             params['difficulty'] = self.difficulty
         if self.question_type:
             params['type'] = self.question_type
+        if token:
+            params['token'] = token
         return params
 
-    def fetch_questions(self):
-        params = self._build_params()
-        response = requests.get(self.BASE_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
+    @metrics.timed("api.fetch_questions")
+    def fetch_questions(self, exclude=None):
+        # Serve unseen questions from the local bank first and only top up from OpenDB
+        exclude = set(exclude or ())
+        cached = []
+        if self.bank is not None:
+            cached = self.bank.get(self.amount, self.category, self.difficulty,
+                                   self.question_type, exclude=exclude)
+            if len(cached) >= self.amount:
+                return {'response_code': 0, 'results': cached}
+
+        # Never ask for more than OpenDB holds, which would fail with response code 1
+        available = self.available()
+        if available == 0:
+            if cached:
+                return {'response_code': 1, 'results': cached}
+            raise OpenDBError(1)
+        amount = self.amount if available is None else min(self.amount, available)
+        data = self._fetch_remote(self._build_params(amount=amount))
+        code = data.get('response_code', 0)
+        if code != 0:
+            if cached:
+                return {'response_code': code, 'results': cached}
+            raise OpenDBError(code)
+        if self.bank is not None and data['results']:
+            self.bank.add(data['results'], category=self.category)
+
+        seen = exclude | {question_hash(question) for question in cached}
+        fresh = [question for question in data['results'] if question_hash(question) not in seen]
+        data['results'] = (cached + fresh)[:self.amount]
+        return data
+
+    @classmethod
+    @metrics.timed("api.fetch_many")
+    def fetch_many(cls, specs, bank=None, exclude=None, scheduler=None, max_workers=4, catalog=None):
+        # Fan a mixed batch of FetchSpecs out over a thread pool. Bank hits return
+        # immediately and network calls share the scheduler's pooled session, so
+        # the batch takes as long as the rate limit allows rather than N round-trips
+        exclude = set(exclude or ())
+        clients = [cls(amount=spec.amount, category=spec.category, difficulty=spec.difficulty,
+                       question_type=spec.question_type, bank=bank, scheduler=scheduler, catalog=catalog)
+                   for spec in specs]
+
+        def run(client):
+            try:
+                return client.fetch_questions(exclude=exclude), None
+            except (requests.exceptions.RequestException, OpenDBError) as e:
+                return None, e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(clients)))) as executor:
+            outcomes = list(executor.map(run, clients))
+
+        results = []
+        errors = []
+        seen = set(exclude)
+        for spec, (data, error) in zip(specs, outcomes):
+            if error is not None:
+                errors.append((spec, error))
+                continue
+            for question in data['results']:
+                key = question_hash(question)
+                if key not in seen:
+                    seen.add(key)
+                    results.append(question)
+        return {'response_code': 0, 'results': results, 'errors': errors}
+
+    def request_token(self):
+        data = self.scheduler.get_json(self.TOKEN_URL, {'command': 'request'}, coalesce=False)
+        if data.get('response_code') != 0:
+            raise OpenDBError(data.get('response_code'))
+        return data['token']
+
+    def reset_token(self, token):
+        data = self.scheduler.get_json(self.TOKEN_URL, {'command': 'reset', 'token': token},
+                                       coalesce=False)
+        return data.get('token', token)
+
+    def harvest(self, limit=None, batch_size=MAX_AMOUNT, token=None):
+        # Page through the configured category with a session token so OpenDB never
+        # repeats a question, yielding each decoded page as it arrives. The token
+        # in use is kept on self.token so a caller can resume with it later
+        available = self.available()
+        if available is not None:
+            limit = available if limit is None else min(limit, available)
+        token = self.token = token or self.request_token()
+        amount = min(batch_size, self.MAX_AMOUNT)
+        seen = set()
+        harvested = 0
+        while limit is None or harvested < limit:
+            if limit is not None:
+                amount = min(amount, limit - harvested)
+            data = self._fetch_remote(self._build_params(amount=amount, token=token))
+            code = data.get('response_code')
+            if code == 0:
+                page = []
+                for question in data['results']:
+                    key = question_hash(question)
+                    if key not in seen:
+                        seen.add(key)
+                        page.append(question)
+                if self.bank is not None and page:
+                    self.bank.add(page, category=self.category)
+                harvested += len(page)
+                if page:
+                    yield page
+            elif code == 1:
+                # Fewer than `amount` questions remain for this token
+                if amount == 1:
+                    return
+                amount = max(1, amount // 2)
+            elif code == 3:
+                # Token expired; the seen set keeps the new token from yielding repeats
+                token = self.token = self.request_token()
+            elif code == 4:
+                return
+            elif code == 5:
+                continue
+            else:
+                raise OpenDBError(code)
+
+    def _fetch_remote(self, params):
+        # Every call goes through the shared scheduler so concurrent sessions stay
+        # within OpenDB's per-IP rate limit
+        data = self.scheduler.get_json(self.BASE_URL, params)
+        data.setdefault('results', [])
+
         # Decode HTML entities in questions and answers
         for question in data['results']:
-            question['question'] = html.unescape(question['question'])
-            question['correct_answer'] = html.unescape(question['correct_answer'])
-            question['incorrect_answers'] = [html.unescape(answer) for answer in question['incorrect_answers']]
-        
+            decode_question(question)
+
         return data
 
+class CategoryCatalog:
+    """Local SQLite cache of OpenDB's category list and question counts.
+
+    Entries older than ttl are refetched on use; if OpenDB cannot be reached
+    the stale entries are served instead, and the failure is remembered for
+    failure_ttl so every use does not retry it. With background, refetches run
+    on a daemon thread and callers get the stale entry (or the default: no
+    categories, unknown count) without waiting on OpenDB.
+    """
+
+    def __init__(self, db_path='question_bank.db', ttl=24 * 3600, scheduler=None, failure_ttl=60,
+                 background=False):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.background = background
+        self.scheduler = scheduler or default_scheduler
+        self._lock = threading.Lock()
+        # Refresh key -> (time, error) of its last failed fetch, and keys being refreshed
+        self._failures = {}
+        self._refreshing = set()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_categories (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        # category_id 0 is every category; difficulty '' is the total
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_counts (
+                category_id INTEGER NOT NULL,
+                difficulty TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (category_id, difficulty)
+            )
+        """)
+        self._conn.commit()
+
+    def _refresh(self, key, fetch):
+        # Runs fetch now, or on a daemon thread with background; returns whether
+        # it ran now and succeeded. A fetch that failed recently is not retried
+        with self._lock:
+            failure = self._failures.get(key)
+            if failure is not None and failure[0] >= time.time() - self.failure_ttl:
+                return False
+            if self.background:
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    threading.Thread(target=self._run_refresh, args=(key, fetch), name="catalog-refresh",
+                                     daemon=True).start()
+                return False
+        return self._run_refresh(key, fetch)
+
+    def _run_refresh(self, key, fetch):
+        try:
+            fetch()
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            with self._lock:
+                self._failures[key] = (time.time(), e)
+            return False
+        else:
+            with self._lock:
+                self._failures.pop(key, None)
+            return True
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _fetch_categories(self):
+        categories = OpenDBAPI.fetch_categories(self.scheduler)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM catalog_categories")
+            self._conn.executemany("INSERT INTO catalog_categories (id, name, fetched_at) VALUES (?, ?, ?)",
+                                   [(category_id, name, now) for name, category_id in categories.items()])
+            self._conn.commit()
+
+    def _fetch_counts(self, category, difficulty):
+        if difficulty:
+            counts = {(category, level): count
+                      for level, count in OpenDBAPI.fetch_question_counts(category, self.scheduler).items()}
+        else:
+            # One call refreshes the totals of every category
+            counts = {(category_id, None): count
+                      for category_id, count in OpenDBAPI.fetch_global_counts(self.scheduler).items()}
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO catalog_counts (category_id, difficulty, count, fetched_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(category_id, difficulty) DO UPDATE SET
+                    count = excluded.count, fetched_at = excluded.fetched_at
+            """, [(category_id or 0, level or '', count, now) for (category_id, level), count in counts.items()])
+            self._conn.commit()
+
+    def _read_categories(self):
+        with self._lock:
+            return self._conn.execute("SELECT name, id, fetched_at FROM catalog_categories ORDER BY id").fetchall()
+
+    @metrics.timed("catalog.categories")
+    def categories(self):
+        # Category name -> OpenDB id, in OpenDB's order
+        rows = self._read_categories()
+        if not rows or min(row[2] for row in rows) < time.time() - self.ttl:
+            if self._refresh('categories', self._fetch_categories):
+                rows = self._read_categories()
+            elif not rows:
+                with self._lock:
+                    failure = self._failures.get('categories')
+                if failure is not None:
+                    raise failure[1]
+        return {name: category_id for name, category_id, _ in rows}
+
+    @metrics.timed("catalog.count")
+    def count(self, category=None, difficulty=None):
+        # Questions available for a category (None for all) and difficulty, or
+        # None when OpenDB does not publish that number (all categories by
+        # difficulty) or it is not known yet
+        if category is None and difficulty:
+            return None
+        key = (category or 0, difficulty or '')
+
+        def read_count():
+            with self._lock:
+                return self._conn.execute(
+                    "SELECT count, fetched_at FROM catalog_counts WHERE category_id = ? AND difficulty = ?",
+                    key).fetchone()
+        row = read_count()
+        if row is None or row[1] < time.time() - self.ttl:
+            # Per-difficulty counts come per category, totals in one call for all of them
+            refresh_key = ('counts', category) if difficulty else ('counts', None)
+            if self._refresh(refresh_key, lambda: self._fetch_counts(category, difficulty)):
+                row = read_count()
+        return row[0] if row is not None else None
+
+    def plan(self, specs):
+        # Caps each FetchSpec at the questions available; returns the specs worth
+        # sending and those that cannot return anything
+        planned, skipped = [], []
+        for spec in specs:
+            available = self.count(spec.category, spec.difficulty)
+            if available == 0:
+                skipped.append(spec)
+            elif available is not None and spec.amount > available:
+                planned.append(spec._replace(amount=available))
+            else:
+                planned.append(spec)
+        return planned, skipped
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM catalog_categories")
+            self._conn.execute("DELETE FROM catalog_counts")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
 # Example usage:
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     total_questions = 50  # Adjust this number as needed
     api = OpenDBAPI(amount=total_questions, category=9, difficulty='easy', question_type='multiple')
     questions = api.fetch_questions()
-    print(questions)
\ No newline at end of file
+    logging.getLogger(__name__).info("Fetched %d question(s)", len(questions.get('results', [])))
\ No newline at end of file
@@ -1,132 +1,800 @@
+import os
 import sqlite3
+import json
+import re
 import threading
-from typing import List, Dict
-from queue import Queue
+from contextlib import contextmanager
+from typing import Callable, List, Dict, Set, Iterator, Optional, Tuple
+import numpy as np
+from queue import Queue, Empty
 import time  # Add this import
+from utils.api import question_hash
+from utils.metrics import metrics
+from utils.minhash import DEFAULT_MINHASHER, minhash_text
 
-class Database:
-    _instance = None
-    _conn_pool = Queue()
-    _local = threading.local()
 
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super(Database, cls).__new__(cls)
-        return cls._instance
+def _column_names(cursor, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [col[1] for col in cursor.fetchall()]
 
-    def __init__(self, db_path='quiz_app.db'):
-        if not hasattr(self, 'initialized'):
-            self.db_path = db_path
-            self.initialized = True
-            self.create_tables()
 
-    def get_connection(self):
-        if not hasattr(self._local, 'conn'):
-            if self._conn_pool.empty():
-                self._local.conn = sqlite3.connect(
-                    self.db_path,
-                    check_same_thread=False,
-                    timeout=30  # Added timeout to wait for the database to be unlocked
-                )
-                self._local.conn.row_factory = sqlite3.Row
-                self._local.conn.execute("PRAGMA journal_mode=WAL;")  # Enable WAL mode
-            else:
-                self._local.conn = self._conn_pool.get()
-        return self._local.conn
+def _migration_initial_schema(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            question TEXT,
+            category TEXT,
+            type TEXT,
+            difficulty TEXT,
+            correct_answer TEXT,
+            status TEXT DEFAULT 'pending',
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    # Databases created before the status column existed
+    if 'status' not in _column_names(cursor, 'history'):
+        cursor.execute("ALTER TABLE history ADD COLUMN status TEXT DEFAULT 'pending'")
 
-    def release_connection(self):
-        if hasattr(self._local, 'conn'):
-            self._conn_pool.put(self._local.conn)
-            del self._local.conn
 
-    def create_tables(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        # Create users table
+def _migration_history_indexes(cursor):
+    if 'question_hash' not in _column_names(cursor, 'history'):
+        cursor.execute("ALTER TABLE history ADD COLUMN question_hash TEXT")
+    # Backfill hashes in chunks so large tables are never loaded at once
+    last_id = 0
+    while True:
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL
-            )
-        """)
-        # Create history table
+            SELECT id, question, type, correct_answer FROM history
+            WHERE id > ? ORDER BY id LIMIT 1000
+        """, (last_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany("UPDATE history SET question_hash = ? WHERE id = ?", [
+            (question_hash({'question': row[1], 'type': row[2], 'correct_answer': row[3]}), row[0])
+            for row in rows
+        ])
+        last_id = rows[-1][0]
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_user_status_id ON history (user_id, status, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_user_id ON history (user_id, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_question_hash ON history (question_hash)")
+
+
+def _migration_normalized_store(cursor):
+    # Questions are stored once per content hash; reviews hold the per-user decision
+    cursor.execute("""
+        CREATE TABLE questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hash TEXT UNIQUE NOT NULL,
+            question TEXT,
+            category TEXT,
+            type TEXT,
+            difficulty TEXT,
+            correct_answer TEXT,
+            incorrect_answers TEXT NOT NULL DEFAULT '[]',
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            question_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, question_id),
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            FOREIGN KEY(question_id) REFERENCES questions(id)
+        )
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO questions (hash, question, category, type, difficulty, correct_answer)
+        SELECT question_hash, question, category, type, difficulty, correct_answer
+        FROM history ORDER BY id
+    """)
+    # Review ids keep the old history ids; when a user has the same question more
+    # than once, the latest decided row wins
+    cursor.execute("""
+        INSERT OR IGNORE INTO reviews (id, user_id, question_id, status)
+        SELECT h.id, h.user_id, q.id, COALESCE(h.status, 'pending')
+        FROM history h JOIN questions q ON q.hash = h.question_hash
+        ORDER BY COALESCE(h.status, 'pending') != 'pending' DESC, h.id DESC
+    """)
+    cursor.execute("DROP TABLE history")
+    cursor.execute("CREATE INDEX idx_reviews_user_status_id ON reviews (user_id, status, id)")
+    cursor.execute("CREATE INDEX idx_reviews_question_id ON reviews (question_id)")
+    # Read-only compatibility view with the old history layout
+    cursor.execute("""
+        CREATE VIEW history AS
+        SELECT r.id, r.user_id, q.question, q.category, q.type, q.difficulty,
+               q.correct_answer, r.status, q.hash AS question_hash
+        FROM reviews r JOIN questions q ON q.id = r.question_id
+    """)
+
+
+def _migration_question_search(cursor):
+    # External-content FTS5 index over questions, kept in sync by triggers
+    cursor.execute("""
+        CREATE VIRTUAL TABLE questions_fts USING fts5(
+            question, correct_answer, incorrect_answers, category,
+            content='questions', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER questions_fts_insert AFTER INSERT ON questions BEGIN
+            INSERT INTO questions_fts (rowid, question, correct_answer, incorrect_answers, category)
+            VALUES (new.id, new.question, new.correct_answer, new.incorrect_answers, new.category);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER questions_fts_delete AFTER DELETE ON questions BEGIN
+            INSERT INTO questions_fts (questions_fts, rowid, question, correct_answer, incorrect_answers, category)
+            VALUES ('delete', old.id, old.question, old.correct_answer, old.incorrect_answers, old.category);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER questions_fts_update AFTER UPDATE ON questions BEGIN
+            INSERT INTO questions_fts (questions_fts, rowid, question, correct_answer, incorrect_answers, category)
+            VALUES ('delete', old.id, old.question, old.correct_answer, old.incorrect_answers, old.category);
+            INSERT INTO questions_fts (rowid, question, correct_answer, incorrect_answers, category)
+            VALUES (new.id, new.question, new.correct_answer, new.incorrect_answers, new.category);
+        END
+    """)
+    cursor.execute("INSERT INTO questions_fts (questions_fts) VALUES ('rebuild')")
+
+
+def _index_signatures(cursor, rows: List[tuple]):
+    # rows are (question_id, question dict) pairs not yet in the MinHash index
+    if not rows:
+        return
+    signatures = DEFAULT_MINHASHER.signatures([minhash_text(question) for _, question in rows])
+    buckets = DEFAULT_MINHASHER.band_buckets(signatures)
+    cursor.executemany("INSERT OR IGNORE INTO question_minhash (question_id, signature) VALUES (?, ?)",
+                       [(question_id, signature.tobytes()) for (question_id, _), signature in zip(rows, signatures)])
+    # Sorted by key so the band B-tree is filled in order rather than at random pages
+    question_ids = np.repeat(np.array([question_id for question_id, _ in rows], dtype=np.int64), buckets.shape[1])
+    buckets = buckets.ravel()
+    order = np.lexsort((question_ids, buckets))
+    cursor.executemany("INSERT OR IGNORE INTO question_bands (bucket, question_id) VALUES (?, ?)",
+                       np.column_stack((buckets[order], question_ids[order])).tolist())
+
+
+def _migration_near_duplicate_index(cursor):
+    # MinHash signatures plus LSH band buckets, so near-duplicate lookups only
+    # compare against questions sharing at least one band
+    cursor.execute("""
+        CREATE TABLE question_minhash (
+            question_id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL,
+            FOREIGN KEY(question_id) REFERENCES questions(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE question_bands (
+            bucket INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            PRIMARY KEY (bucket, question_id)
+        ) WITHOUT ROWID
+    """)
+    last_id = 0
+    while True:
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                question TEXT,
-                category TEXT,
-                type TEXT,
-                difficulty TEXT,
-                correct_answer TEXT,
-                status TEXT DEFAULT 'pending',
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        """)
-        conn.commit()
-        
-        # Ensure status column exists
-        cursor.execute("PRAGMA table_info(history)")
-        columns = [col[1] for col in cursor.fetchall()]
-        if 'status' not in columns:
-            cursor.execute("ALTER TABLE history ADD COLUMN status TEXT DEFAULT 'pending'")
-            conn.commit()
-
-    def execute_with_retry(self, cursor, query, params=(), retries=5, delay=1):
+            SELECT id, question, correct_answer FROM questions
+            WHERE id > ? ORDER BY id LIMIT 1000
+        """, (last_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        _index_signatures(cursor, [(row[0], {'question': row[1], 'correct_answer': row[2]}) for row in rows])
+        last_id = rows[-1][0]
+
+
+def _migration_anonymous_review_unique(cursor):
+    # UNIQUE(user_id, question_id) never fires for NULL user ids, so anonymous
+    # reviews could repeat. Collapse them the way migration 3 did (the latest
+    # decided row wins) and enforce uniqueness on an expression instead
+    cursor.execute("""
+        DELETE FROM reviews
+        WHERE user_id IS NULL AND id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY question_id ORDER BY status != 'pending' DESC, id DESC
+                ) AS rank
+                FROM reviews WHERE user_id IS NULL
+            ) WHERE rank = 1
+        )
+    """)
+    cursor.execute("CREATE UNIQUE INDEX idx_reviews_user_question ON reviews (IFNULL(user_id, 0), question_id)")
+
+
+def _migration_deferred_signatures(cursor):
+    # Start of every bulk load whose questions still await MinHash signatures
+    cursor.execute("""
+        CREATE TABLE deferred_signatures (
+            after_id INTEGER NOT NULL
+        )
+    """)
+
+
+# Page cache of the writer connection during a bulk load, in KiB (negative for
+# PRAGMA cache_size); SQLite's default of 2 MiB thrashes on the band B-tree
+_BULK_CACHE_SIZE = -131072
+_DEFAULT_CACHE_SIZE = -2000
+
+# Questions signed per write job once a bulk load ends
+_SIGNATURE_BATCH = 5000
+
+
+def _defer_signatures(cursor):
+    # Questions inserted from here on are signed by _sign_deferred when the load ends
+    cursor.execute("INSERT INTO deferred_signatures (after_id) SELECT COALESCE(MAX(id), 0) FROM questions")
+    cursor.execute(f"PRAGMA cache_size = {_BULK_CACHE_SIZE}")
+
+
+def _sign_deferred(cursor, last_id: Optional[int] = None) -> Optional[int]:
+    # Signs the next batch of unsigned questions after the oldest deferred load
+    # and returns the last id signed, or None once none are left
+    if last_id is None:
+        cursor.execute("SELECT MIN(after_id) FROM deferred_signatures")
+        last_id = cursor.fetchone()[0]
+        if last_id is None:
+            return None
+    cursor.execute("""
+        SELECT q.id, q.question, q.correct_answer FROM questions q
+        LEFT JOIN question_minhash m ON m.question_id = q.id
+        WHERE m.question_id IS NULL AND q.id > ?
+        ORDER BY q.id LIMIT ?
+    """, (last_id, _SIGNATURE_BATCH))
+    rows = cursor.fetchall()
+    if not rows:
+        cursor.execute("DELETE FROM deferred_signatures")
+        cursor.execute(f"PRAGMA cache_size = {_DEFAULT_CACHE_SIZE}")
+        return None
+    _index_signatures(cursor, [(row[0], {'question': row[1], 'correct_answer': row[2]}) for row in rows])
+    return rows[-1][0]
+
+
+# Ordered forward migrations; append new ones, never edit applied ones
+MIGRATIONS = [
+    (1, _migration_initial_schema),
+    (2, _migration_history_indexes),
+    (3, _migration_normalized_store),
+    (4, _migration_question_search),
+    (5, _migration_near_duplicate_index),
+    (6, _migration_anonymous_review_unique),
+    (7, _migration_deferred_signatures),
+]
+
+# Keeps IN (...) lists below SQLite's bound-parameter limit
+_CHUNK_SIZE = 500
+
+# bm25 column weights: question, correct_answer, incorrect_answers, category
+_SEARCH_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+
+def _fts_query(text: str) -> str:
+    # Every word becomes a quoted prefix term, so user input never reaches the
+    # FTS5 query syntax and "versail" matches "Versailles"
+    return ' '.join(f'"{term}"*' for term in re.findall(r"\w+", text))
+
+
+class _WriteJob:
+    __slots__ = ('fn', 'transactional', 'event', 'result', 'error')
+
+    def __init__(self, fn, transactional=True):
+        self.fn = fn
+        self.transactional = transactional
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout: Optional[float] = None):
+        if not self.event.wait(timeout):
+            raise TimeoutError(f"Write did not complete within {timeout}s")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class ConnectionManager:
+    """Bounded pool of read-only connections plus a single writer thread.
+
+    Writes are queued as callables taking a cursor. The writer drains whatever
+    is pending into one transaction (group commit), isolating each job in a
+    savepoint so one failing write does not undo the others.
+    """
+
+    def __init__(self, db_path: str, max_readers: int = 4, max_batch: int = 64,
+                 wal_autocheckpoint: int = 1000, checkpoint_interval: int = 0,
+                 busy_timeout: float = 30, write_timeout: Optional[float] = 300):
+        self.db_path = db_path
+        self.max_readers = max_readers
+        self.max_batch = max_batch
+        self.wal_autocheckpoint = wal_autocheckpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.busy_timeout = busy_timeout
+        self.write_timeout = write_timeout
+        self._readers = Queue(maxsize=max_readers)
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+        self._writes = Queue()
+        self._commits = 0
+        self._closed = False
+        self._startup_error = None
+        self._ready = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-writer", daemon=True)
+        self._writer.start()
+        self._ready.wait()
+        if self._startup_error is not None:
+            # e.g. the directory does not exist; surfaced like a direct sqlite3.connect
+            self._closed = True
+            self._writer.join()
+            raise self._startup_error
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        if readonly:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                                   check_same_thread=False, timeout=self.busy_timeout)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   timeout=self.busy_timeout, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def reader(self):
+        try:
+            conn = self._readers.get_nowait()
+        except Empty:
+            with self._reader_lock:
+                create = self._reader_count < self.max_readers
+                if create:
+                    self._reader_count += 1
+            conn = self._connect(readonly=True) if create else self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def submit(self, fn: Callable, transactional: bool = True) -> _WriteJob:
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot write to a closed database")
+        job = _WriteJob(fn, transactional)
+        self._writes.put(job)
+        return job
+
+    def write(self, fn: Callable, transactional: bool = True):
+        return self.submit(fn, transactional).wait(self.write_timeout)
+
+    def execute_with_retry(self, cursor, query, params=(), retries=5, delay=0.05):
+        # busy_timeout already waits on the lock; this only covers its rare expiry
         for attempt in range(retries):
             try:
                 cursor.execute(query, params)
                 return
             except sqlite3.OperationalError as e:
                 if "database is locked" in str(e):
-                    time.sleep(delay)
+                    metrics.increment("quiz_db_lock_retries_total")
+                    time.sleep(delay * 2 ** attempt)
                 else:
                     raise
         raise sqlite3.OperationalError("Max retries exceeded for query: " + query)
 
-    def add_user(self, username: str) -> bool:
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def checkpoint(self, mode: str = "PASSIVE"):
+        return tuple(self.write(lambda cursor: cursor.execute(f"PRAGMA wal_checkpoint({mode})").fetchone(),
+                                transactional=False))
+
+    def _write_loop(self):
+        try:
+            conn = self._connect()
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute(f"PRAGMA wal_autocheckpoint={int(self.wal_autocheckpoint)}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            cursor = conn.cursor()
+        except Exception as e:
+            self._startup_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        stop = False
+        while not stop:
+            batch = [self._writes.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except Empty:
+                    break
+            if None in batch:
+                stop = True
+                batch = [job for job in batch if job is not None]
+            try:
+                self._run_batch(conn, cursor, batch)
+            except Exception as e:
+                # Anything escaping a job's own handling (e.g. ROLLBACK TO failing
+                # after SQLite already rolled back on SQLITE_FULL) fails the jobs
+                # still waiting in this batch; the writer keeps serving the queue
+                if conn.in_transaction:
+                    try:
+                        conn.rollback()
+                    except sqlite3.Error:
+                        pass
+                for job in batch:
+                    if not job.event.is_set():
+                        job.error = job.error or e
+                        job.event.set()
+        conn.close()
+
+    def _run_batch(self, conn, cursor, batch):
+        group = []
+        for job in batch:
+            if job.transactional:
+                group.append(job)
+                continue
+            if group:
+                self._commit_batch(conn, cursor, group)
+                group = []
+            self._run_outside_transaction(cursor, job)
+        if group:
+            self._commit_batch(conn, cursor, group)
+
+    def _run_outside_transaction(self, cursor, job):
+        # Checkpoints and similar pragmas cannot run inside a transaction
+        try:
+            job.result = job.fn(cursor)
+        except Exception as e:
+            job.error = e
+        job.event.set()
+
+    def _commit_batch(self, conn, cursor, batch):
+        start = time.perf_counter()
+        try:
+            self.execute_with_retry(cursor, "BEGIN IMMEDIATE")
+        except Exception as e:
+            for job in batch:
+                job.error = e
+                job.event.set()
+            return
+        for job in batch:
+            cursor.execute("SAVEPOINT write_job")
+            try:
+                job.result = job.fn(cursor)
+                cursor.execute("RELEASE write_job")
+            except Exception as e:
+                cursor.execute("ROLLBACK TO write_job")
+                cursor.execute("RELEASE write_job")
+                job.error = e
         try:
+            cursor.execute("COMMIT")
+        except Exception as e:
+            conn.rollback()
+            for job in batch:
+                job.error = job.error or e
+        for job in batch:
+            job.event.set()
+        metrics.observe("quiz_db_group_commit_ms", (time.perf_counter() - start) * 1000)
+        metrics.increment("quiz_db_write_jobs_total", len(batch))
+        self._commits += 1
+        if self.checkpoint_interval and self._commits % self.checkpoint_interval == 0:
+            cursor.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        # Pending writes ahead of the sentinel are committed before the writer exits
+        self._writes.put(None)
+        self._writer.join()
+        while not self._readers.empty():
+            self._readers.get().close()
+
+
+# Question and review ids carry their shard index above this bit, so any id can
+# be routed back to the file holding it without a lookup
+SHARD_ID_BITS = 40
+
+
+def shard_of(row_id: int) -> int:
+    return row_id >> SHARD_ID_BITS
+
+
+def _seed_sequences(cursor, base: int):
+    # AUTOINCREMENT continues from sqlite_sequence, so ids in this file start above base
+    for table in ('questions', 'reviews'):
+        cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?", (base, table, base))
+        cursor.execute("""
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+        """, (table, base, table))
+
+
+class SingleFileBackend:
+    """Default storage layout: users, questions and every review share one file."""
+
+    def __init__(self, db_path: str, **manager_options):
+        self.db_path = db_path
+        self.catalog = ConnectionManager(db_path, **manager_options)
+        self.shards = [self.catalog]
+
+    def shard_index(self, user_id: Optional[int]) -> int:
+        return 0
+
+    def shard(self, user_id: Optional[int]) -> ConnectionManager:
+        return self.shards[self.shard_index(user_id)]
+
+    def shard_for_id(self, row_id: int) -> ConnectionManager:
+        return self.shards[shard_of(row_id)]
+
+    def shards_for(self, user_id: Optional[int]) -> List[ConnectionManager]:
+        # The user's own shard first, then the rest of the corpus
+        own = self.shard(user_id)
+        return [own] + [shard for shard in self.shards if shard is not own]
+
+    def managers(self) -> List[ConnectionManager]:
+        return list(dict.fromkeys([self.catalog, *self.shards]))
+
+    def close(self):
+        for manager in self.managers():
+            manager.close()
+
+
+class ShardedBackend(SingleFileBackend):
+    """Spreads users over shard_count files by user id, next to a catalog of users.
+
+    Every file has its own writer thread, so writes for users on different
+    shards never wait on each other's lock. A user's questions and reviews live
+    on their shard; the catalog only allocates user ids. shard_count must stay
+    the same for the lifetime of the data; with at least as many shards as
+    users, each user gets a file of their own.
+    """
+
+    def __init__(self, db_path: str, shard_count: int = 8, **manager_options):
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+        root, ext = os.path.splitext(db_path)
+        self.db_path = db_path
+        self.shard_count = shard_count
+        self.catalog = ConnectionManager(db_path, **manager_options)
+        self.shards = [ConnectionManager(f"{root}.shard{index}{ext or '.db'}", **manager_options)
+                       for index in range(shard_count)]
+
+    def shard_index(self, user_id: Optional[int]) -> int:
+        # Anonymous reviews live on the first shard
+        return (user_id or 0) % self.shard_count
+
+
+class Database:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(Database, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, db_path='quiz_app.db', write_behind=False, backend: Optional[SingleFileBackend] = None,
+                 **manager_options):
+        if not hasattr(self, 'initialized'):
+            self.db_path = db_path
+            self._backend = backend or SingleFileBackend(db_path, **manager_options)
+            # With write_behind, status updates return immediately and are
+            # flushed in batches by each shard's writer thread
+            self.write_behind = write_behind
+            self._pending_status = {}
+            self._pending_lock = threading.Lock()
+            self._status_flush = {}
+            self._bulk_loads = 0
+            self._bulk_lock = threading.Lock()
+            self.initialized = True
+            self.create_tables()
+
+    def create_tables(self):
+        self.migrate()
+
+    @metrics.timed("db.schema_version")
+    def schema_version(self, manager: Optional[ConnectionManager] = None) -> int:
+        def read_version(cursor):
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            return cursor.fetchone()[0]
+        return (manager or self._backend.catalog).write(read_version)
+
+    @metrics.timed("db.migrate")
+    def migrate(self):
+        for manager in self._backend.managers():
+            current = self.schema_version(manager)
+            for version, migration in MIGRATIONS:
+                if version <= current:
+                    continue
+
+                def apply(cursor, version=version, migration=migration):
+                    # Another process may have applied it while we waited for the lock
+                    cursor.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,))
+                    if cursor.fetchone() is None:
+                        migration(cursor)
+                        cursor.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+                manager.write(apply)
+        for index, manager in enumerate(self._backend.shards):
+            if index:
+                manager.write(lambda cursor, base=index << SHARD_ID_BITS: _seed_sequences(cursor, base))
+            # Finishes the signing of a bulk load that was interrupted
+            self._sign_deferred(manager)
+
+    def _sign_deferred(self, manager: ConnectionManager):
+        # One write job per batch, so other writers get the lock in between
+        last_id = manager.write(_sign_deferred)
+        while last_id is not None:
+            last_id = manager.write(lambda cursor, last_id=last_id: _sign_deferred(cursor, last_id))
+
+    @contextmanager
+    def bulk_load(self):
+        """Defers MinHash signing of questions stored in this process until the block exits.
+
+        Signatures and their band rows dominate bulk insert time; they are
+        built in batches of ordered write jobs at the end. Near-duplicate
+        lookups do not see questions added inside the block until then.
+        """
+        with self._bulk_lock:
+            self._bulk_loads += 1
+            if self._bulk_loads == 1:
+                for shard in self._backend.shards:
+                    shard.write(_defer_signatures)
+        try:
+            yield self
+        finally:
+            with self._bulk_lock:
+                self._bulk_loads -= 1
+                if not self._bulk_loads:
+                    for shard in self._backend.shards:
+                        self._sign_deferred(shard)
+
+    def execute_with_retry(self, cursor, query, params=(), retries=5, delay=0.05):
+        self._backend.catalog.execute_with_retry(cursor, query, params, retries, delay)
+
+    @metrics.timed("db.checkpoint")
+    def checkpoint(self, mode: str = "PASSIVE") -> List[tuple]:
+        # One (busy, log frames, checkpointed frames) tuple per file
+        return [manager.checkpoint(mode) for manager in self._backend.managers()]
+
+    @metrics.timed("db.add_user")
+    def add_user(self, username: str) -> bool:
+        def insert(cursor):
             self.execute_with_retry(cursor, "INSERT INTO users (username) VALUES (?)", (username,))
-            conn.commit()
-            return True
+            return cursor.lastrowid
+
+        catalog = self._backend.catalog
+        try:
+            user_id = catalog.write(insert)
         except sqlite3.IntegrityError:
             return False
+        self._mirror_user(user_id, username)
+        return True
+
+    @metrics.timed("db.get_or_create_user")
+    def get_or_create_user(self, username: str) -> int:
+        # One round trip for both new and returning users
+        def upsert(cursor):
+            cursor.execute("INSERT OR IGNORE INTO users (username) VALUES (?)", (username,))
+            created = cursor.rowcount > 0
+            cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+            return cursor.fetchone()[0], created
+
+        user_id, created = self._backend.catalog.write(upsert)
+        if created:
+            self._mirror_user(user_id, username)
+        return user_id
+
+    def _mirror_user(self, user_id: int, username: str):
+        shard = self._backend.shard(user_id)
+        if shard is not self._backend.catalog:
+            # Mirrored so the shard can join usernames onto its own reviews
+            shard.write(lambda cursor: cursor.execute(
+                "INSERT OR IGNORE INTO users (id, username) VALUES (?, ?)", (user_id, username)))
 
+    @metrics.timed("db.get_user_id")
     def get_user_id(self, username: str) -> int:
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-        result = cursor.fetchone()
+        with self._backend.catalog.reader() as conn:
+            result = conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
         return result[0] if result else None
 
-    def add_question_history(self, user_id: int, question: Dict) -> int:
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO history (user_id, question, category, type, difficulty, correct_answer)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            user_id,
+    def _add_reviews(self, cursor, user_id: int, questions: List[Dict]) -> Tuple[List[int], Set[int]]:
+        # Returns the review id of every question and the ids of the reviews this call created
+        hashes = [question_hash(question) for question in questions]
+        cursor.executemany("""
+            INSERT INTO questions (hash, question, category, type, difficulty, correct_answer, incorrect_answers)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(hash) DO UPDATE SET incorrect_answers = excluded.incorrect_answers
+            WHERE questions.incorrect_answers = '[]'
+        """, [(
+            digest,
             question.get('question'),
             question.get('category'),
             question.get('type'),
             question.get('difficulty'),
-            question.get('correct_answer')
-        ))
-        conn.commit()
-        return cursor.lastrowid  # Return the inserted record's ID
+            question.get('correct_answer'),
+            json.dumps(question.get('incorrect_answers') or [])
+        ) for digest, question in zip(hashes, questions)])
+
+        unique_hashes = list(dict.fromkeys(hashes))
+        question_ids = {}
+        for start in range(0, len(unique_hashes), _CHUNK_SIZE):
+            chunk = unique_hashes[start:start + _CHUNK_SIZE]
+            cursor.execute(
+                f"SELECT hash, id FROM questions WHERE hash IN ({','.join('?' * len(chunk))})", chunk)
+            question_ids.update(cursor.fetchall())
+
+        # Only questions created by this batch still need MinHash signatures;
+        # during a bulk load they are signed when it ends
+        stored_ids = [] if self._bulk_loads else list(question_ids.values())
+        indexed = set()
+        for start in range(0, len(stored_ids), _CHUNK_SIZE):
+            chunk = stored_ids[start:start + _CHUNK_SIZE]
+            cursor.execute(f"""
+                SELECT question_id FROM question_minhash
+                WHERE question_id IN ({','.join('?' * len(chunk))})
+            """, chunk)
+            indexed.update(row[0] for row in cursor.fetchall())
+        new_questions = {}
+        for digest, question in zip(hashes, questions):
+            if stored_ids and question_ids[digest] not in indexed:
+                new_questions.setdefault(question_ids[digest], question)
+        _index_signatures(cursor, list(new_questions.items()))
+
+        # A user already holding a question keeps their existing review and decision;
+        # AUTOINCREMENT puts every review created here above the current maximum
+        ids = [question_ids[h] for h in hashes]
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM reviews")
+        last_review_id = cursor.fetchone()[0]
+        cursor.executemany("INSERT OR IGNORE INTO reviews (user_id, question_id) VALUES (?, ?)",
+                           [(user_id, question_id) for question_id in dict.fromkeys(ids)])
+        review_ids = {}
+        unique_ids = list(dict.fromkeys(ids))
+        for start in range(0, len(unique_ids), _CHUNK_SIZE):
+            chunk = unique_ids[start:start + _CHUNK_SIZE]
+            cursor.execute(f"""
+                SELECT question_id, id FROM reviews
+                WHERE user_id IS ? AND question_id IN ({','.join('?' * len(chunk))})
+                ORDER BY id
+            """, [user_id, *chunk])
+            review_ids.update(cursor.fetchall())
+        return ([review_ids[question_id] for question_id in ids],
+                {review_id for review_id in review_ids.values() if review_id > last_review_id})
 
+    @metrics.timed("db.add_question_history")
+    def add_question_history(self, user_id: int, question: Dict) -> int:
+        return self.add_question_history_bulk(user_id, [question])[0]
+
+    @metrics.timed("db.add_question_history_bulk")
+    def add_question_history_bulk(self, user_id: int, questions: List[Dict]) -> List[int]:
+        return self.import_question_history(user_id, questions)[0]
+
+    @metrics.timed("db.import_question_history")
+    def import_question_history(self, user_id: int, questions: List[Dict]) -> Tuple[List[int], Set[int]]:
+        # Like add_question_history_bulk, also returning which reviews are new
+        if not questions:
+            return [], set()
+        return self._backend.shard(user_id).write(lambda cursor: self._add_reviews(cursor, user_id, questions))
+
+    @metrics.timed("db.get_user_history")
     def get_user_history(self, user_id: int) -> List[Dict]:
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT question, category, type, difficulty, correct_answer
-            FROM history
-            WHERE user_id = ?
-        """, (user_id,))
-        rows = cursor.fetchall()
+        with self._backend.shard(user_id).reader() as conn:
+            rows = conn.execute("""
+                SELECT q.question, q.category, q.type, q.difficulty, q.correct_answer
+                FROM reviews r JOIN questions q ON q.id = r.question_id
+                WHERE r.user_id IS ?
+                ORDER BY r.id
+            """, (user_id,)).fetchall()
         history = []
         for row in rows:
             history.append({
@@ -138,52 +806,413 @@ class Database:
             })
         return history
 
-    def update_question_status(self, history_id: int, status: str):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        self.execute_with_retry(cursor, """
-            UPDATE history 
-            SET status = ?
+    @metrics.timed("db.get_decided_hashes")
+    def get_decided_hashes(self, user_id: int) -> Set[str]:
+        self._sync_pending_writes()
+        with self._backend.shard(user_id).reader() as conn:
+            cursor = conn.execute("""
+                SELECT q.hash
+                FROM reviews r JOIN questions q ON q.id = r.question_id
+                WHERE r.user_id IS ? AND r.status != 'pending'
+            """, (user_id,))
+            return {row[0] for row in cursor}
+
+    def _write_statuses(self, cursor, updates: List[tuple]):
+        cursor.executemany("""
+            UPDATE reviews
+            SET status = ?, updated_at = CURRENT_TIMESTAMP
             WHERE id = ?
-        """, (status, history_id))
-        conn.commit()
-        # Debug statement
-        cursor.execute("SELECT * FROM history WHERE id = ?", (history_id,))
-        updated_row = cursor.fetchone()
-        print(f"Debug: Updated Row - {updated_row}")
+        """, updates)
 
-    def get_user_history_by_status(self, user_id: int, status: str) -> List[Dict]:
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, question, category, type, difficulty, correct_answer
-            FROM history
-            WHERE user_id = ? AND status = ?
-        """, (user_id, status))
-        rows = cursor.fetchall()
-        return [{
+    def _flush_pending_status(self, cursor, index: int):
+        with self._pending_lock:
+            pending = self._pending_status.pop(index, {})
+        if pending:
+            self._write_statuses(cursor, [(status, history_id) for history_id, status in pending.items()])
+
+    @metrics.timed("db.update_question_status")
+    def update_question_status(self, history_id: int, status: str):
+        shard = self._backend.shard_for_id(history_id)
+        if not self.write_behind:
+            shard.write(lambda cursor: self._write_statuses(cursor, [(status, history_id)]))
+            return
+        index = shard_of(history_id)
+        with self._pending_lock:
+            # Repeated clicks on the same question collapse to the last status
+            pending = self._pending_status.setdefault(index, {})
+            schedule = not pending
+            pending[history_id] = status
+            if schedule:
+                self._status_flush[index] = shard.submit(lambda cursor: self._flush_pending_status(cursor, index))
+
+    @metrics.timed("db.update_question_statuses")
+    def update_question_statuses(self, statuses: Dict[int, str]):
+        # Mixed statuses in one transaction per shard, or one write-behind batch
+        if self.write_behind:
+            for history_id, status in statuses.items():
+                self.update_question_status(history_id, status)
+            return
+        by_shard = {}
+        for history_id, status in statuses.items():
+            by_shard.setdefault(shard_of(history_id), []).append((status, history_id))
+        jobs = [self._backend.shards[index].submit(
+                    lambda cursor, updates=updates: self._write_statuses(cursor, updates))
+                for index, updates in by_shard.items()]
+        for job in jobs:
+            job.wait(self._backend.catalog.write_timeout)
+
+    @metrics.timed("db.update_question_status_bulk")
+    def update_question_status_bulk(self, history_ids: List[int], status: str,
+                                    from_status: Optional[str] = None) -> int:
+        # With from_status, only reviews still in that status are changed
+        by_shard = {}
+        for history_id in dict.fromkeys(history_ids):
+            by_shard.setdefault(shard_of(history_id), []).append(history_id)
+
+        guard, guard_params = (" AND status = ?", [from_status]) if from_status is not None else ("", [])
+
+        def update(cursor, ids):
+            updated = 0
+            for start in range(0, len(ids), _CHUNK_SIZE):
+                chunk = ids[start:start + _CHUNK_SIZE]
+                cursor.execute(f"""
+                    UPDATE reviews
+                    SET status = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id IN ({','.join('?' * len(chunk))}){guard}
+                """, [status, *chunk, *guard_params])
+                updated += cursor.rowcount
+            return updated
+        # Each shard commits its part on its own writer, in parallel
+        jobs = [self._backend.shards[index].submit(lambda cursor, ids=ids: update(cursor, ids))
+                for index, ids in by_shard.items()]
+        return sum(job.wait(self._backend.catalog.write_timeout) for job in jobs)
+
+    @metrics.timed("db.update_status_by_filter")
+    def update_status_by_filter(self, user_id: int, status: str, from_status: Optional[str] = 'pending',
+                                category: Optional[str] = None, question_type: Optional[str] = None,
+                                difficulty: Optional[str] = None) -> int:
+        query = """
+            UPDATE reviews
+            SET status = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE user_id IS ?
+        """
+        params = [status, user_id]
+        if from_status is not None:
+            query += " AND status = ?"
+            params.append(from_status)
+        filters = []
+        for column, value in (('category', category), ('type', question_type), ('difficulty', difficulty)):
+            if value is not None:
+                filters.append(f"{column} = ?")
+                params.append(value)
+        if filters:
+            query += f" AND question_id IN (SELECT id FROM questions WHERE {' AND '.join(filters)})"
+
+        def update(cursor):
+            cursor.execute(query, params)
+            return cursor.rowcount
+        return self._backend.shard(user_id).write(update)
+
+    @metrics.timed("db.flush")
+    def flush(self):
+        # Writes are applied in order, so once this barrier commits on every
+        # shard each status update queued before it is durable
+        barriers = [shard.submit(lambda cursor: None) for shard in self._backend.shards]
+        for barrier in barriers:
+            barrier.wait(self._backend.catalog.write_timeout)
+        for index, job in list(self._status_flush.items()):
+            if job.error is not None:
+                del self._status_flush[index]
+                raise job.error
+
+    def _sync_pending_writes(self):
+        # Reads that depend on status wait for queued write-behind updates
+        if any(not job.event.is_set() for job in list(self._status_flush.values())):
+            self.flush()
+
+    @staticmethod
+    def _review_to_dict(row) -> Dict:
+        return {
             'id': row[0],
             'question': row[1],
             'category': row[2],
             'type': row[3],
             'difficulty': row[4],
-            'correct_answer': row[5]
-        } for row in rows]
+            'correct_answer': row[5],
+            'incorrect_answers': json.loads(row[6])
+        }
+
+    @metrics.timed("db.get_user_history_by_status")
+    def get_user_history_by_status(self, user_id: int, status: str) -> List[Dict]:
+        return list(self.iter_user_history(user_id, status))
+
+    @metrics.timed("db.get_user_history_page")
+    def get_user_history_page(self, user_id: int, status: Optional[str] = None,
+                              after_id: int = 0, limit: int = 20) -> List[Dict]:
+        # Keyset pagination: seeks straight to after_id on (user_id, status, id)
+        query = """
+            SELECT r.id, q.question, q.category, q.type, q.difficulty, q.correct_answer, q.incorrect_answers
+            FROM reviews r JOIN questions q ON q.id = r.question_id
+            WHERE r.user_id IS ? AND r.id > ?
+        """
+        params = [user_id, after_id]
+        if status is not None:
+            query += " AND r.status = ?"
+            params.append(status)
+        query += " ORDER BY r.id LIMIT ?"
+        params.append(limit)
+        self._sync_pending_writes()
+        with self._backend.shard(user_id).reader() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self._review_to_dict(row) for row in rows]
+
+    def iter_user_history(self, user_id: int, status: Optional[str] = None,
+                          batch_size: int = 500) -> Iterator[Dict]:
+        after_id = 0
+        while True:
+            page = self.get_user_history_page(user_id, status, after_id, batch_size)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after_id = page[-1]['id']
+
+    @metrics.timed("db.get_review_ids")
+    def get_review_ids(self, user_id: int, status: Optional[str] = None) -> List[int]:
+        # Ids only, in review order, for rebuilding a queue without loading questions
+        query = "SELECT id FROM reviews WHERE user_id IS ?"
+        params = [user_id]
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY id"
+        self._sync_pending_writes()
+        with self._backend.shard(user_id).reader() as conn:
+            return [row[0] for row in conn.execute(query, params)]
+
+    @metrics.timed("db.get_reviews")
+    def get_reviews(self, history_ids: List[int]) -> Dict[int, Dict]:
+        by_shard = {}
+        for history_id in dict.fromkeys(history_ids):
+            by_shard.setdefault(shard_of(history_id), []).append(history_id)
+        reviews = {}
+        for index, ids in by_shard.items():
+            with self._backend.shards[index].reader() as conn:
+                for start in range(0, len(ids), _CHUNK_SIZE):
+                    chunk = ids[start:start + _CHUNK_SIZE]
+                    for row in conn.execute(f"""
+                        SELECT r.id, q.question, q.category, q.type, q.difficulty, q.correct_answer,
+                               q.incorrect_answers
+                        FROM reviews r JOIN questions q ON q.id = r.question_id
+                        WHERE r.id IN ({','.join('?' * len(chunk))})
+                    """, chunk):
+                        review = self._review_to_dict(row)
+                        review['history_id'] = review.pop('id')
+                        reviews[row[0]] = review
+        return reviews
+
+    @metrics.timed("db.get_history_page")
+    def get_history_page(self, status: Optional[str] = None, after_id: int = 0,
+                         limit: int = 500) -> List[Dict]:
+        # Same keyset walk as get_user_history_page, across every user
+        query = """
+            SELECT r.id, q.question, q.category, q.type, q.difficulty, q.correct_answer, q.incorrect_answers,
+                   u.username
+            FROM reviews r
+            JOIN questions q ON q.id = r.question_id
+            LEFT JOIN users u ON u.id = r.user_id
+            WHERE r.id > ?
+        """
+        params = [after_id]
+        if status is not None:
+            query += " AND r.status = ?"
+            params.append(status)
+        query += " ORDER BY r.id LIMIT ?"
+        self._sync_pending_writes()
+        # Shards hold disjoint, ascending id ranges, so they are walked in order
+        history = []
+        for shard in self._backend.shards[shard_of(after_id):]:
+            with shard.reader() as conn:
+                rows = conn.execute(query, [*params, limit - len(history)]).fetchall()
+            for row in rows:
+                entry = self._review_to_dict(row)
+                entry['username'] = row[7]
+                history.append(entry)
+            if len(history) >= limit:
+                break
+        return history
+
+    def iter_history(self, status: Optional[str] = None, batch_size: int = 500) -> Iterator[Dict]:
+        after_id = 0
+        while True:
+            page = self.get_history_page(status, after_id, batch_size)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after_id = page[-1]['id']
+
+    @metrics.timed("db.question_ids_by_hash")
+    def question_ids_by_hash(self, hashes: List[str], user_id: Optional[int] = None) -> Dict[str, int]:
+        # A copy on user_id's own shard wins over copies held elsewhere
+        remaining = list(dict.fromkeys(hashes))
+        ids = {}
+        for shard in self._backend.shards_for(user_id):
+            if not remaining:
+                break
+            with shard.reader() as conn:
+                for start in range(0, len(remaining), _CHUNK_SIZE):
+                    chunk = remaining[start:start + _CHUNK_SIZE]
+                    ids.update(conn.execute(
+                        f"SELECT hash, id FROM questions WHERE hash IN ({','.join('?' * len(chunk))})", chunk))
+            remaining = [digest for digest in remaining if digest not in ids]
+        return ids
+
+    @metrics.timed("db.find_near_duplicates")
+    def find_near_duplicates(self, signatures, threshold: float = 0.8,
+                             user_id: Optional[int] = None) -> List[Optional[tuple]]:
+        # Returns the best (question_id, similarity) at or above threshold per
+        # signature, preferring a match on user_id's own shard
+        buckets = DEFAULT_MINHASHER.band_buckets(signatures).tolist()
+        matches = [None] * len(buckets)
+        for shard in self._backend.shards_for(user_id):
+            todo = [i for i, match in enumerate(matches) if match is None]
+            if not todo:
+                break
+            found = self._near_duplicates_in(shard, [signatures[i] for i in todo], [buckets[i] for i in todo],
+                                             threshold)
+            for i, match in zip(todo, found):
+                matches[i] = match
+        return matches
+
+    def _near_duplicates_in(self, shard: ConnectionManager, signatures, buckets: List[List[int]],
+                            threshold: float) -> List[Optional[tuple]]:
+        unique_buckets = list({bucket for row in buckets for bucket in row})
+        members = {}
+        stored = {}
+        with shard.reader() as conn:
+            for start in range(0, len(unique_buckets), _CHUNK_SIZE):
+                chunk = unique_buckets[start:start + _CHUNK_SIZE]
+                for bucket, question_id in conn.execute(f"""
+                    SELECT bucket, question_id FROM question_bands
+                    WHERE bucket IN ({','.join('?' * len(chunk))})
+                """, chunk):
+                    members.setdefault(bucket, []).append(question_id)
+            candidate_ids = list({question_id for ids in members.values() for question_id in ids})
+            for start in range(0, len(candidate_ids), _CHUNK_SIZE):
+                chunk = candidate_ids[start:start + _CHUNK_SIZE]
+                for question_id, blob in conn.execute(f"""
+                    SELECT question_id, signature FROM question_minhash
+                    WHERE question_id IN ({','.join('?' * len(chunk))})
+                """, chunk):
+                    stored[question_id] = np.frombuffer(blob, dtype=np.uint32)
+
+        matches = []
+        for signature, row in zip(signatures, buckets):
+            candidates = list({question_id for bucket in row for question_id in members.get(bucket, ())})
+            if not candidates:
+                matches.append(None)
+                continue
+            scores = DEFAULT_MINHASHER.similarity(signature, np.stack([stored[c] for c in candidates]))
+            best = int(scores.argmax())
+            matches.append((candidates[best], float(scores[best])) if scores[best] >= threshold else None)
+        return matches
+
+    @metrics.timed("db.get_questions")
+    def get_questions(self, question_ids: List[int]) -> Dict[int, Dict]:
+        by_shard = {}
+        for question_id in dict.fromkeys(question_ids):
+            by_shard.setdefault(shard_of(question_id), []).append(question_id)
+        questions = {}
+        for index, ids in by_shard.items():
+            with self._backend.shards[index].reader() as conn:
+                for start in range(0, len(ids), _CHUNK_SIZE):
+                    chunk = ids[start:start + _CHUNK_SIZE]
+                    for row in conn.execute(f"""
+                        SELECT id, question, category, type, difficulty, correct_answer, incorrect_answers
+                        FROM questions WHERE id IN ({','.join('?' * len(chunk))})
+                    """, chunk):
+                        question = self._review_to_dict(row)
+                        del question['id']
+                        questions[row[0]] = question
+        return questions
+
+    @metrics.timed("db.get_review_statuses")
+    def get_review_statuses(self, user_id: int, question_ids: List[int]) -> Dict[int, str]:
+        unique = list(dict.fromkeys(question_ids))
+        statuses = {}
+        self._sync_pending_writes()
+        with self._backend.shard(user_id).reader() as conn:
+            for start in range(0, len(unique), _CHUNK_SIZE):
+                chunk = unique[start:start + _CHUNK_SIZE]
+                statuses.update(conn.execute(f"""
+                    SELECT question_id, status FROM reviews
+                    WHERE user_id IS ? AND question_id IN ({','.join('?' * len(chunk))})
+                """, [user_id, *chunk]))
+        return statuses
+
+    @metrics.timed("db.search_questions")
+    def search_questions(self, query: str, user_id: Optional[int] = None, all_users: bool = False,
+                         status: Optional[str] = None, difficulty: Optional[str] = None,
+                         limit: int = 20) -> List[Dict]:
+        match = _fts_query(query)
+        if not match:
+            return []
+        sql = f"""
+            SELECT r.id, q.question, q.category, q.type, q.difficulty, q.correct_answer, q.incorrect_answers,
+                   r.status, u.username,
+                   bm25(questions_fts, {', '.join(map(str, _SEARCH_WEIGHTS))}) AS rank
+            FROM questions_fts f
+            JOIN questions q ON q.id = f.rowid
+            JOIN reviews r ON r.question_id = q.id
+            LEFT JOIN users u ON u.id = r.user_id
+            WHERE questions_fts MATCH ?
+        """
+        params = [match]
+        if not all_users:
+            sql += " AND r.user_id IS ?"
+            params.append(user_id)
+        if status is not None:
+            sql += " AND r.status = ?"
+            params.append(status)
+        if difficulty is not None:
+            sql += " AND q.difficulty = ?"
+            params.append(difficulty)
+        sql += " ORDER BY rank, r.id LIMIT ?"
+        params.append(limit)
+        self._sync_pending_writes()
+        # Each shard ranks its own top matches; bm25 statistics are per shard,
+        # so the merged order across shards is approximate
+        shards = self._backend.shards if all_users else [self._backend.shard(user_id)]
+        rows = []
+        for shard in shards:
+            with shard.reader() as conn:
+                rows.extend(conn.execute(sql, params).fetchall())
+        rows.sort(key=lambda row: (row[9], row[0]))
+        results = []
+        for row in rows[:limit]:
+            entry = self._review_to_dict(row)
+            entry['status'] = row[7]
+            entry['username'] = row[8]
+            results.append(entry)
+        return results
 
+    @metrics.timed("db.reset_database")
     def reset_database(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DROP TABLE IF EXISTS history")
-        cursor.execute("DROP TABLE IF EXISTS users")
-        conn.commit()
+        def drop_all(cursor):
+            cursor.execute("DROP VIEW IF EXISTS history")
+            cursor.execute("DROP TABLE IF EXISTS history")
+            cursor.execute("DROP TABLE IF EXISTS reviews")
+            cursor.execute("DROP TABLE IF EXISTS questions_fts")
+            cursor.execute("DROP TABLE IF EXISTS question_bands")
+            cursor.execute("DROP TABLE IF EXISTS question_minhash")
+            cursor.execute("DROP TABLE IF EXISTS deferred_signatures")
+            cursor.execute("DROP TABLE IF EXISTS questions")
+            cursor.execute("DROP TABLE IF EXISTS users")
+            cursor.execute("DROP TABLE IF EXISTS schema_version")
+        for manager in self._backend.managers():
+            manager.write(drop_all)
         self.create_tables()
-        self._local.conn.close()
 
     def close(self):
-        while not self._conn_pool.empty():
-            conn = self._conn_pool.get()
-            conn.close()
-        if hasattr(self._local, 'conn'):
-            self._local.conn.close()
-            del self._local.conn
-            del self._local.conn
\ No newline at end of file
+        # Closing the managers commits every queued write, including pending statuses
+        self._backend.close()
+        Database._instance = None
@@ -0,0 +1,84 @@
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.api import question_hash
+from utils.db import Database
+from utils.minhash import DEFAULT_MINHASHER, minhash_text
+
+# kind is 'exact' or 'near'; question_id is None for duplicates within the batch itself
+Duplicate = namedtuple('Duplicate', ['question', 'kind', 'question_id', 'similarity', 'status'])
+DedupResult = namedtuple('DedupResult', ['questions', 'duplicates'])
+
+DEDUP_MODES = ('link', 'drop')
+
+
+class Deduplicator:
+    """Filters fetched questions against the stored corpus before they are inserted.
+
+    Exact duplicates are found by content hash and near duplicates through the
+    MinHash band index. A duplicate of a question the user already holds is
+    dropped, so it inherits their existing decision. In 'link' mode a duplicate
+    of a question only other users hold is replaced by the stored question, so
+    reviews attach to one row per fact; in 'drop' mode it is discarded.
+    """
+
+    def __init__(self, db: Database, threshold: float = 0.8, mode: str = 'link'):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"mode must be one of {DEDUP_MODES}")
+        self.db = db
+        self.threshold = threshold
+        self.mode = mode
+
+    def filter(self, user_id: Optional[int], questions: List[Dict]) -> DedupResult:
+        if not questions:
+            return DedupResult([], [])
+        hashes = [question_hash(question) for question in questions]
+        signatures = DEFAULT_MINHASHER.signatures([minhash_text(question) for question in questions])
+        existing = self.db.question_ids_by_hash(hashes, user_id)
+        near = self.db.find_near_duplicates(signatures, self.threshold, user_id)
+
+        matches = []
+        for digest, match in zip(hashes, near):
+            if digest in existing:
+                matches.append(('exact', existing[digest], 1.0))
+            elif match is not None:
+                matches.append(('near', match[0], match[1]))
+            else:
+                matches.append(None)
+        statuses = self.db.get_review_statuses(user_id, [m[1] for m in matches if m])
+        canonical = {}
+        if self.mode == 'link':
+            canonical = self.db.get_questions([m[1] for m in matches if m and m[1] not in statuses])
+
+        kept, duplicates = [], []
+        kept_signatures = []
+        kept_hashes = set()
+        kept_ids = set()
+        for question, digest, signature, match in zip(questions, hashes, signatures, matches):
+            if match is None:
+                batch_match = self._match_batch(signature, kept_signatures)
+                if digest in kept_hashes or batch_match is not None:
+                    duplicates.append(Duplicate(question, 'exact' if digest in kept_hashes else 'near',
+                                                None, 1.0 if digest in kept_hashes else batch_match, None))
+                    continue
+                kept.append(question)
+                kept_hashes.add(digest)
+                kept_signatures.append(signature)
+                continue
+
+            kind, question_id, similarity = match
+            duplicates.append(Duplicate(question, kind, question_id, similarity, statuses.get(question_id)))
+            if question_id in canonical and question_id not in kept_ids:
+                kept.append(dict(canonical[question_id], duplicate_of=question_id))
+                kept_ids.add(question_id)
+        return DedupResult(kept, duplicates)
+
+    def _match_batch(self, signature, kept_signatures) -> Optional[float]:
+        # Batches are small, so earlier survivors are compared directly
+        if not kept_signatures:
+            return None
+        scores = DEFAULT_MINHASHER.similarity(signature, np.stack(kept_signatures))
+        best = float(scores.max())
+        return best if best >= self.threshold else None
@@ -0,0 +1,106 @@
+import argparse
+import csv
+import io
+import json
+import sys
+import zipfile
+from typing import BinaryIO, Dict, Iterable, Optional
+
+from utils.db import Database, ShardedBackend
+from utils.render import QuestionRenderer, render_question
+
+EXPORT_FIELDS = ['id', 'username', 'question', 'category', 'type', 'difficulty',
+                 'correct_answer', 'incorrect_answers']
+
+EXPORT_MIME_TYPES = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'html-zip': 'application/zip',
+}
+
+
+def _text_stream(fp: BinaryIO) -> io.TextIOWrapper:
+    return io.TextIOWrapper(fp, encoding='utf-8', newline='', write_through=True)
+
+
+def export_jsonl(rows: Iterable[Dict], fp: BinaryIO) -> int:
+    count = 0
+    out = _text_stream(fp)
+    for row in rows:
+        out.write(json.dumps({field: row.get(field) for field in EXPORT_FIELDS}, ensure_ascii=False))
+        out.write('\n')
+        count += 1
+    out.detach()
+    return count
+
+
+def export_csv(rows: Iterable[Dict], fp: BinaryIO) -> int:
+    count = 0
+    out = _text_stream(fp)
+    writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(dict(row, incorrect_answers=json.dumps(row.get('incorrect_answers') or [])))
+        count += 1
+    out.detach()
+    return count
+
+
+def export_html_zip(rows: Iterable[Dict], fp: BinaryIO) -> int:
+    count = 0
+    with zipfile.ZipFile(fp, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for row in rows:
+            archive.writestr(QuestionRenderer.file_name(row['id']), render_question(row))
+            count += 1
+    return count
+
+
+EXPORTERS = {
+    'jsonl': export_jsonl,
+    'csv': export_csv,
+    'html-zip': export_html_zip,
+}
+
+
+def export_questions(db: Database, fmt: str, fp: BinaryIO, user_id: Optional[int] = None,
+                     all_users: bool = False, status: str = 'accepted', batch_size: int = 500) -> int:
+    # Rows are pulled from keyset-paginated cursors and written as they arrive,
+    # so memory stays flat regardless of how many questions are exported
+    if all_users:
+        rows = db.iter_history(status, batch_size=batch_size)
+    else:
+        rows = db.iter_user_history(user_id, status, batch_size=batch_size)
+    return EXPORTERS[fmt](rows, fp)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export reviewed quiz questions.")
+    parser.add_argument('--db', default='quiz_app.db', help="Path to the SQLite database")
+    parser.add_argument('--shards', type=int, help="Open the database as this many per-user shard files")
+    parser.add_argument('--format', choices=sorted(EXPORTERS), default='jsonl')
+    parser.add_argument('--user', help="Export a single user's questions (default: all users)")
+    parser.add_argument('--status', default='accepted', choices=['accepted', 'rejected', 'pending'])
+    parser.add_argument('-o', '--output', help="Output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    db = Database(db_path=args.db, backend=ShardedBackend(args.db, args.shards) if args.shards else None)
+    user_id = None
+    if args.user is not None:
+        user_id = db.get_user_id(args.user)
+        if user_id is None:
+            parser.error(f"Unknown user: {args.user}")
+
+    try:
+        if args.output:
+            with open(args.output, 'wb') as fp:
+                count = export_questions(db, args.format, fp, user_id, args.user is None, args.status)
+        else:
+            count = export_questions(db, args.format, sys.stdout.buffer, user_id, args.user is None, args.status)
+            sys.stdout.buffer.flush()
+    finally:
+        db.close()
+    print(f"Exported {count} question(s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import codecs
+import csv
+import json
+from typing import BinaryIO, Dict, Iterator, Tuple
+
+# Each reader yields (record, offset): the raw question dict and the byte offset
+# just past it, so an import can be resumed by seeking back to that offset
+
+CSV_FIELDS = ('category', 'type', 'difficulty', 'question', 'correct_answer', 'incorrect_answers')
+
+_WHITESPACE = ' \t\r\n'
+
+
+class _TextBuffer:
+    """Incrementally decoded window over a binary file that tracks byte offsets."""
+
+    def __init__(self, f: BinaryIO, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        # Byte offset of self.text[self.mark]; advanced lazily so each byte is encoded once
+        self.mark = 0
+        self.mark_offset = f.tell()
+        self.eof = False
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        # Drop what has been consumed so the window stays about one chunk wide
+        if self.pos:
+            self.offset()
+            self.text = self.text[self.pos:]
+            self.pos = self.mark = 0
+        chunk = self.f.read(self.chunk_size)
+        self.eof = not chunk
+        self.text += self.decoder.decode(chunk, final=self.eof)
+        return not self.eof or bool(self.text)
+
+    def peek(self) -> str:
+        # Next non-whitespace character, or '' at end of file
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def offset(self) -> int:
+        self.mark_offset += len(self.text[self.mark:self.pos].encode('utf-8'))
+        self.mark = self.pos
+        return self.mark_offset
+
+
+def _seek_results(buf: _TextBuffer, decoder: json.JSONDecoder):
+    # Position the buffer just inside the question array: either the top-level
+    # array or the "results" array of an OpenDB response object
+    if buf.peek() == '[':
+        buf.pos += 1
+        return
+    if buf.peek() != '{':
+        raise ValueError("Expected a JSON array of questions or an object with a 'results' array")
+    buf.pos += 1
+    while True:
+        char = buf.peek()
+        if char == ',':
+            buf.pos += 1
+            continue
+        if char != '"':
+            raise ValueError("No 'results' array found in JSON object")
+        key = _decode_value(buf, decoder)
+        if buf.peek() != ':':
+            raise ValueError("Malformed JSON object")
+        buf.pos += 1
+        if key == 'results':
+            if buf.peek() != '[':
+                raise ValueError("'results' is not an array")
+            buf.pos += 1
+            return
+        _decode_value(buf, decoder)
+
+
+def _decode_value(buf: _TextBuffer, decoder: json.JSONDecoder):
+    buf.peek()
+    while True:
+        try:
+            value, end = decoder.raw_decode(buf.text, buf.pos)
+        except json.JSONDecodeError:
+            # Most likely the value runs past the window; read more and retry
+            if not buf.fill():
+                raise
+            continue
+        # A number at the window edge could still be cut short
+        if end == len(buf.text) and not buf.eof:
+            buf.fill()
+            continue
+        buf.pos = end
+        return value
+
+
+def iter_json(f: BinaryIO, offset: int = 0, chunk_size: int = 1 << 20) -> Iterator[Tuple[Dict, int]]:
+    """Stream questions out of a JSON array or OpenDB response without loading the file.
+
+    A non-zero offset must come from a previous record, and resumes inside the array.
+    """
+    decoder = json.JSONDecoder()
+    f.seek(offset)
+    buf = _TextBuffer(f, chunk_size)
+    if not offset:
+        _seek_results(buf, decoder)
+    while True:
+        char = buf.peek()
+        if char == ',':
+            buf.pos += 1
+            continue
+        if char in (']', ''):
+            return
+        yield _decode_value(buf, decoder), buf.offset()
+
+
+def iter_jsonl(f: BinaryIO, offset: int = 0) -> Iterator[Tuple[Dict, int]]:
+    f.seek(offset)
+    for line in iter(f.readline, b''):
+        if line.strip():
+            yield json.loads(line), f.tell()
+
+
+def _parse_answers(value: str):
+    value = value.strip()
+    if value.startswith('['):
+        return json.loads(value)
+    return [answer for answer in value.split('|') if answer] if value else []
+
+
+def iter_csv(f: BinaryIO, offset: int = 0) -> Iterator[Tuple[Dict, int]]:
+    """Stream questions from a CSV with a header row naming CSV_FIELDS.
+
+    incorrect_answers holds either a JSON list or '|'-separated answers.
+    """
+    # Lines are pulled one at a time so f.tell() lands exactly after each row
+    lines = (line.decode('utf-8') for line in iter(f.readline, b''))
+    f.seek(0)
+    header = next(csv.reader(lines), None)
+    if header is None:
+        return
+    header[0] = header[0].lstrip('\ufeff')
+    missing = set(CSV_FIELDS) - set(header) - {'incorrect_answers'}
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(sorted(missing))}")
+    if offset:
+        f.seek(offset)
+    for row in csv.reader(lines):
+        if not row:
+            continue
+        record = dict(zip(header, row))
+        record['incorrect_answers'] = _parse_answers(record.get('incorrect_answers', ''))
+        yield record, f.tell()
+
+
+READERS = {'.json': iter_json, '.jsonl': iter_jsonl, '.ndjson': iter_jsonl, '.csv': iter_csv}
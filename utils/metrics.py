@@ -0,0 +1,158 @@
+import bisect
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+slow_log = logging.getLogger("quiz.slow")
+
+# Millisecond bucket bounds shared by every latency histogram
+DEFAULT_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class MetricsRegistry:
+    """In-process latency histograms and counters with a slow-call log."""
+
+    def __init__(self, slow_threshold_ms: Optional[float] = None):
+        if slow_threshold_ms is None:
+            slow_threshold_ms = float(os.environ.get("QUIZ_SLOW_QUERY_MS", 100))
+        self.slow_threshold_ms = slow_threshold_ms
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name: str, value_ms: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value_ms)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def timed(self, op: str):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception:
+                    self.increment("quiz_call_errors_total", op=op)
+                    raise
+                finally:
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    self.observe("quiz_call_duration_ms", elapsed_ms, op=op)
+                    if elapsed_ms >= self.slow_threshold_ms:
+                        slow_log.warning("%s took %.1f ms", op, elapsed_ms)
+                if isinstance(result, (list, set, tuple)):
+                    self.increment("quiz_rows_returned_total", len(result), op=op)
+                return result
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> List[Dict]:
+        rows = []
+        with self._lock:
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                rows.append(dict(labels, metric=name, count=histogram.count,
+                                 avg_ms=round(histogram.total / histogram.count, 3) if histogram.count else 0,
+                                 p50_ms=round(histogram.quantile(0.5), 3), p95_ms=round(histogram.quantile(0.95), 3),
+                                 max_ms=round(histogram.max, 3)))
+            for (name, labels), value in sorted(self._counters.items()):
+                rows.append(dict(labels, metric=name, count=value))
+        return rows
+
+    def render_prometheus(self) -> str:
+        def label_text(labels, extra=()):
+            pairs = [f'{k}="{v}"' for k, v in (*labels, *extra)]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{name}_sum{label_text(labels)} {histogram.total:.3f}")
+                lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+metrics = MetricsRegistry()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1", registry: MetricsRegistry = metrics):
+    # Serves registry.render_prometheus() on /metrics from a daemon thread
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,75 @@
+import re
+from typing import Dict, List
+
+import numpy as np
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def minhash_text(question: Dict) -> str:
+    # Rephrasings of the same fact share the answer, so it is part of the fingerprint
+    text = f"{question.get('question') or ''} {question.get('correct_answer') or ''}"
+    return _NON_WORD.sub(" ", text.casefold()).strip()
+
+
+class MinHasher:
+    """Vectorized MinHash signatures over byte shingles, with LSH band buckets.
+
+    Signatures are persisted, so the parameters of DEFAULT_MINHASHER must not
+    change once a database has been indexed.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 4, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        if not 1 <= shingle_size <= 4:
+            raise ValueError("shingle_size must be between 1 and 4 bytes")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Multiply-add-shift hashing of 32-bit shingles: (a * x + b) mod 2**64 >> 32
+        self._a = (rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1))[:, None]
+        self._b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)[:, None]
+        self._band_mix = rng.integers(1, 1 << 63, (bands, self.rows), dtype=np.uint64)
+
+    def _shingles(self, texts: List[str]):
+        # Every window of shingle_size bytes packed into one integer; returns
+        # the shingle values and where each text's run starts
+        k = self.shingle_size
+        encoded = [text.encode('utf-8').ljust(k, b'\0') for text in texts]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        counts = lengths - k + 1
+        offsets = np.cumsum(counts) - counts
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+        starts = np.arange(counts.sum()) + np.repeat(np.cumsum(lengths) - lengths - offsets, counts)
+        values = np.zeros(len(starts), dtype=np.uint64)
+        for j in range(k):
+            values |= data[starts + j] << np.uint64(8 * j)
+        return values, offsets
+
+    def signatures(self, texts: List[str], chunk_size: int = 256) -> np.ndarray:
+        if len(texts) > chunk_size:
+            return np.concatenate([self.signatures(texts[start:start + chunk_size], chunk_size)
+                                   for start in range(0, len(texts), chunk_size)])
+        if not texts:
+            return np.empty((0, self.num_perm), dtype=np.uint32)
+        # One (num_perm x total_shingles) pass per chunk, reduced per text
+        values, offsets = self._shingles(texts)
+        hashed = (self._a * values[None, :] + self._b) >> np.uint64(32)
+        return np.minimum.reduceat(hashed, offsets, axis=1).T.astype(np.uint32)
+
+    def band_buckets(self, signatures: np.ndarray) -> np.ndarray:
+        # Each band of rows collapses to one signed 64-bit key; the per-band
+        # multipliers keep equal rows in different bands from colliding
+        banded = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        return (banded * self._band_mix).sum(axis=2).view(np.int64)
+
+    @staticmethod
+    def similarity(signature: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        # Fraction of agreeing permutations estimates Jaccard similarity
+        return (candidates == signature).mean(axis=1)
+
+
+DEFAULT_MINHASHER = MinHasher()
@@ -0,0 +1,220 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from utils.api import OpenDBAPI, QuestionBank, decode_question
+from utils.db import Database, ShardedBackend
+from utils.dedup import DEDUP_MODES, Deduplicator
+from utils.importer import READERS, iter_jsonl
+from utils.metrics import slow_log
+
+# A page of questions plus the checkpoint position reached once it is stored
+SourceBatch = namedtuple('SourceBatch', ['questions', 'position'])
+
+RULE_FIELDS = ('category', 'difficulty', 'type')
+
+
+class PipelineStats:
+    def __init__(self, fetched=0, inserted=0, rejected=0, duplicates=0):
+        self.fetched = fetched
+        self.inserted = inserted
+        self.rejected = rejected
+        self.duplicates = duplicates
+        # Counts restored from a checkpoint do not count towards this run's rate
+        self._resumed_from = fetched
+        self.started = time.perf_counter()
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return (self.fetched - self._resumed_from) / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        return {'fetched': self.fetched, 'inserted': self.inserted,
+                'rejected': self.rejected, 'duplicates': self.duplicates}
+
+
+def load_checkpoint(path: Optional[str]) -> Dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, state: Dict):
+    # Written to a temporary file and renamed so a crash never leaves half a checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def opendb_source(api: OpenDBAPI, limit: Optional[int] = None, batch_size: int = OpenDBAPI.MAX_AMOUNT,
+                  position: Optional[Dict] = None) -> Iterator[SourceBatch]:
+    # Resumes with the saved session token; if it has expired, dedup catches repeats
+    position = position or {}
+    fetched = position.get('fetched', 0)
+    remaining = None if limit is None else max(0, limit - fetched)
+    if remaining == 0:
+        return
+    for page in api.harvest(limit=remaining, batch_size=batch_size, token=position.get('token')):
+        fetched += len(page)
+        yield SourceBatch(page, {'token': api.token, 'fetched': fetched})
+
+
+def file_source(paths: List[str], batch_size: int = 500,
+                position: Optional[Dict] = None) -> Iterator[SourceBatch]:
+    # Streams .json, .jsonl or .csv dumps of OpenDB-shaped questions, still
+    # HTML-escaped; the position is the file index and byte offset after the
+    # last record of the batch
+    position = position or {}
+    for index in range(position.get('file', 0), len(paths)):
+        reader = READERS.get(os.path.splitext(paths[index])[1].lower(), iter_jsonl)
+        with open(paths[index], 'rb') as f:
+            offset = position.get('offset', 0) if index == position.get('file', 0) else 0
+            batch = []
+            for record, offset in reader(f, offset):
+                batch.append(decode_question(record))
+                if len(batch) >= batch_size:
+                    yield SourceBatch(batch, {'file': index, 'offset': offset})
+                    batch = []
+            if batch:
+                yield SourceBatch(batch, {'file': index, 'offset': offset})
+        position = {'file': index + 1}
+
+
+def parse_rule(text: str) -> tuple:
+    field, sep, value = text.partition('=')
+    if not sep or field not in RULE_FIELDS:
+        raise ValueError(f"Rules look like FIELD=VALUE with FIELD one of {', '.join(RULE_FIELDS)}")
+    return field, value
+
+
+def matches_rules(question: Dict, rules: Iterable[tuple]) -> bool:
+    return any((question.get(field) or '').casefold() == value.casefold() for field, value in rules)
+
+
+def run_pipeline(db: Database, source: Iterable[SourceBatch], user_id: Optional[int] = None,
+                 dedup: Optional[Deduplicator] = None, reject_rules: Iterable[tuple] = (),
+                 checkpoint_path: Optional[str] = None, checkpoint: Optional[Dict] = None,
+                 progress: Optional[Callable[[PipelineStats], None]] = None,
+                 commit_interval: int = 0, defer_index: bool = False) -> PipelineStats:
+    """Stream batches from source through dedup and auto-reject into the database.
+
+    Batches are gathered until at least commit_interval questions are pending
+    and then stored in one transaction (0 commits every batch). The checkpoint
+    is saved after each commit, so a rerun with the same checkpoint picks up
+    after the last stored batch. With defer_index, near-duplicate indexing
+    runs once at the end (see Database.bulk_load).
+    """
+    if defer_index:
+        with db.bulk_load():
+            return run_pipeline(db, source, user_id, dedup, reject_rules, checkpoint_path, checkpoint,
+                                progress, commit_interval)
+    checkpoint = dict(checkpoint or {})
+    stats = PipelineStats(**checkpoint.get('stats', {}))
+    reject_rules = list(reject_rules)
+
+    def commit(pending, position):
+        stats.fetched += len(pending)
+        questions = dedup.filter(user_id, pending).questions if dedup else pending
+        stats.duplicates += len(pending) - len(questions)
+        history_ids, created = db.import_question_history(user_id, questions)
+        stats.inserted += len(created)
+        if reject_rules:
+            # Reviews the user already decided keep their decision
+            rejected = [history_id for question, history_id in zip(questions, history_ids)
+                        if matches_rules(question, reject_rules)]
+            stats.rejected += db.update_question_status_bulk(rejected, 'rejected', from_status='pending')
+        if checkpoint_path:
+            checkpoint.update(position=position, stats=stats.to_dict())
+            save_checkpoint(checkpoint_path, checkpoint)
+        if progress:
+            progress(stats)
+
+    pending, position = [], None
+    for batch in source:
+        pending.extend(batch.questions)
+        position = batch.position
+        if len(pending) >= commit_interval:
+            commit(pending, position)
+            pending = []
+    if pending:
+        commit(pending, position)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch or load quiz questions into the database without the UI.")
+    parser.add_argument('--db', default='quiz_app.db', help="Path to the SQLite database")
+    parser.add_argument('--shards', type=int, help="Open the database as this many per-user shard files")
+    parser.add_argument('--user', help="Store reviews for this user, creating it if needed (default: anonymous)")
+    parser.add_argument('--file', action='append', default=[],
+                        help="Read questions from a .json, .jsonl or .csv dump instead of OpenDB (repeatable)")
+    parser.add_argument('--category', type=int, help="OpenDB category id")
+    parser.add_argument('--difficulty', choices=['easy', 'medium', 'hard'])
+    parser.add_argument('--type', dest='question_type', choices=['multiple', 'boolean'])
+    parser.add_argument('--limit', type=int, help="Stop after this many questions from OpenDB")
+    parser.add_argument('--batch-size', type=int, default=OpenDBAPI.MAX_AMOUNT)
+    parser.add_argument('--commit-interval', type=int, default=0,
+                        help="Store at least this many questions per transaction (default: one batch)")
+    parser.add_argument('--bank', help="Also keep fetched questions in this question bank")
+    parser.add_argument('--dedup', choices=DEDUP_MODES + ('off',), default='link',
+                        help="'off' also defers duplicate indexing until the end of the run")
+    parser.add_argument('--threshold', type=float, default=0.8, help="Near-duplicate similarity threshold")
+    parser.add_argument('--reject', action='append', default=[], metavar='FIELD=VALUE',
+                        help="Auto-reject questions whose category, difficulty or type matches (repeatable)")
+    parser.add_argument('--checkpoint', help="Resume from and save progress to this file")
+    parser.add_argument('-q', '--quiet', action='store_true', help="Only print the final summary")
+    args = parser.parse_args(argv)
+
+    if args.quiet:
+        # Bulk commits routinely cross the slow-call threshold; keep stderr to the summary
+        slow_log.setLevel(logging.ERROR)
+
+    try:
+        rules = [parse_rule(rule) for rule in args.reject]
+    except ValueError as e:
+        parser.error(str(e))
+
+    checkpoint = load_checkpoint(args.checkpoint)
+    source_key = {'files': args.file} if args.file else {
+        'category': args.category, 'difficulty': args.difficulty, 'type': args.question_type}
+    if checkpoint and checkpoint.get('source') != source_key:
+        parser.error(f"Checkpoint {args.checkpoint} was written for a different source")
+    checkpoint['source'] = source_key
+
+    def report(stats):
+        print(f"fetched {stats.fetched}, inserted {stats.inserted}, rejected {stats.rejected}, "
+              f"duplicates {stats.duplicates} ({stats.rate:.1f} questions/s)", file=sys.stderr)
+
+    db = Database(db_path=args.db, backend=ShardedBackend(args.db, args.shards) if args.shards else None)
+    bank = QuestionBank(db_path=args.bank) if args.bank else None
+    try:
+        user_id = None if args.user is None else db.get_or_create_user(args.user)
+
+        if args.file:
+            source = file_source(args.file, args.batch_size, checkpoint.get('position'))
+        else:
+            api = OpenDBAPI(category=args.category, difficulty=args.difficulty,
+                            question_type=args.question_type, bank=bank)
+            source = opendb_source(api, args.limit, args.batch_size, checkpoint.get('position'))
+
+        dedup = None if args.dedup == 'off' else Deduplicator(db, threshold=args.threshold, mode=args.dedup)
+        stats = run_pipeline(db, source, user_id, dedup, rules, args.checkpoint, checkpoint,
+                             progress=None if args.quiet else report, commit_interval=args.commit_interval,
+                             defer_index=dedup is None)
+    finally:
+        db.close()
+        if bank is not None:
+            bank.close()
+    report(stats)
+
+
+if __name__ == "__main__":
+    main()
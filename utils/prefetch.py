@@ -0,0 +1,100 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from utils.api import FetchSpec, OpenDBAPI, OpenDBError, question_hash
+from utils.db import Database
+from utils.dedup import Deduplicator
+
+
+class QueuePrefetcher:
+    """Keeps a review queue topped up by fetching the next batch in the background.
+
+    Fetches go through OpenDBAPI.fetch_many, so they share the process-wide rate
+    limiter, pass through the optional Deduplicator, and each batch is stored
+    with a single bulk insert.
+    """
+
+    def __init__(self, db: Database, user_id: Optional[int], specs: List[FetchSpec], bank=None,
+                 watermark: int = 5, exclude: Optional[Iterable[str]] = None,
+                 dedup: Optional[Deduplicator] = None, catalog=None, retry_delay: float = 5.0,
+                 max_retry_delay: float = 60.0):
+        self.db = db
+        self.user_id = user_id
+        self.specs = list(specs)
+        self.bank = bank
+        self.watermark = watermark
+        self.dedup = dedup
+        self.catalog = catalog
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.error = None
+        # Set once OpenDB has nothing left (a clean empty fetch or code 1/4) so a
+        # drained source is not polled forever; other failures are retried after
+        # a delay that doubles up to max_retry_delay
+        self.exhausted = False
+        self._failures = 0
+        self._retry_at = 0.0
+        self._exclude = set(exclude or ())
+        self._ready = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def maybe_prefetch(self, remaining: int) -> bool:
+        if remaining >= self.watermark or self.running or self.exhausted:
+            return False
+        if time.monotonic() < self._retry_at:
+            return False
+        with self._lock:
+            # Questions fetched but not yet drained count as queued
+            if remaining + len(self._ready) >= self.watermark:
+                return False
+        self._thread = threading.Thread(target=self._run, name="queue-prefetch", daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self):
+        try:
+            with self._lock:
+                exclude = set(self._exclude)
+            data = OpenDBAPI.fetch_many(self.specs, bank=self.bank, exclude=exclude, catalog=self.catalog)
+            fetched = data['results']
+            if not fetched:
+                errors = [error for _, error in data['errors']]
+                if all(isinstance(error, OpenDBError) and error.response_code in (1, 4) for error in errors):
+                    self.exhausted = True
+                    self.error = errors[0] if errors else None
+                else:
+                    self._failed(errors[0])
+                return
+            questions = self.dedup.filter(self.user_id, fetched).questions if self.dedup else fetched
+            history_ids = self.db.add_question_history_bulk(self.user_id, questions)
+            for question, history_id in zip(questions, history_ids):
+                question['history_id'] = history_id
+            with self._lock:
+                self._exclude.update(question_hash(question) for question in fetched + questions)
+                self._ready.extend(questions)
+            self.error = None
+            self._failures = 0
+        except Exception as e:
+            self._failed(e)
+
+    def _failed(self, error: Exception):
+        self.error = error
+        self._failures += 1
+        delay = min(self.max_retry_delay, self.retry_delay * 2 ** (self._failures - 1))
+        self._retry_at = time.monotonic() + delay
+
+    def wait(self, timeout: Optional[float] = None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def drain(self) -> List[Dict]:
+        with self._lock:
+            ready, self._ready = self._ready, []
+        return ready
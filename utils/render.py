@@ -0,0 +1,117 @@
+import html
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from string import Template
+from typing import Dict, List, Optional
+
+# Parsed once at import; rendering is a single substitute() call
+QUESTION_TEMPLATE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<style>
+    body { font-family: Arial, sans-serif; margin: 20px; }
+    .container { max-width: 800px; margin: auto; padding: 20px; border: 1px solid #ddd; border-radius: 8px; }
+    .metadata { background-color: #f5f5f5; padding: 10px; border-radius: 5px; margin: 10px 0; }
+    .question { font-size: 18px; margin: 15px 0; }
+    .answer { color: #2e7d32; font-weight: bold; }
+    .timestamp { color: #666; font-size: 12px; margin-top: 20px; }
+</style>
+</head>
+<body>
+<div class="container">
+    <div class="metadata">
+        <strong>Category:</strong> $category<br>
+        <strong>Difficulty:</strong> $difficulty<br>
+        <strong>Type:</strong> $type
+    </div>
+    <div class="question">
+        <strong>Question:</strong> $question
+    </div>
+    <div class="answer">
+        <strong>Correct Answer:</strong> $correct_answer
+    </div>
+    <div class="options">
+        <strong>Options:</strong>
+        <ul>
+            $options
+        </ul>
+    </div>
+    <div class="timestamp">
+        Captured on: $captured_at
+    </div>
+</div>
+</body>
+</html>
+""")
+
+
+def question_options(question: Dict) -> List[str]:
+    if question.get('type') == 'boolean':
+        return ["True", "False"]
+    return list(question.get('incorrect_answers') or []) + [question.get('correct_answer')]
+
+
+def render_question(question: Dict, captured_at: Optional[datetime] = None) -> bytes:
+    captured_at = captured_at or datetime.now()
+    return QUESTION_TEMPLATE.substitute(
+        category=html.escape(question.get('category') or ''),
+        difficulty=html.escape((question.get('difficulty') or '').capitalize()),
+        type=html.escape((question.get('type') or '').capitalize()),
+        question=html.escape(question.get('question') or ''),
+        correct_answer=html.escape(question.get('correct_answer') or ''),
+        options=''.join(f"<li>{html.escape(option or '')}</li>" for option in question_options(question)),
+        captured_at=captured_at.strftime('%Y-%m-%d %H:%M:%S'),
+    ).encode('utf-8')
+
+
+class QuestionRenderer:
+    """Renders question pages to bytes, keeping the most recent ones in an LRU cache."""
+
+    def __init__(self, max_entries: int = 256, output_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.output_dir = output_dir
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def file_name(history_id: int) -> str:
+        return f"question_{history_id}.html"
+
+    def render(self, history_id: int, question: Dict) -> bytes:
+        with self._lock:
+            content = self._cache.get(history_id)
+            if content is not None:
+                self._cache.move_to_end(history_id)
+                return content
+
+        content = render_question(question)
+        with self._lock:
+            self._cache[history_id] = content
+            self._cache.move_to_end(history_id)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+        # Disk copies are opt-in
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(os.path.join(self.output_dir, self.file_name(history_id)), "wb") as f:
+                f.write(content)
+        return content
+
+    def invalidate(self, history_id: int):
+        with self._lock:
+            self._cache.pop(history_id, None)
+        if self.output_dir:
+            path = os.path.join(self.output_dir, self.file_name(history_id))
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self):
+        # Review ids restart at 1 after a database reset, so nothing cached stays valid
+        with self._lock:
+            history_ids = list(self._cache)
+            self._cache.clear()
+        for history_id in history_ids:
+            self.invalidate(history_id)
@@ -0,0 +1,164 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from utils.db import Database
+
+
+class _Entry:
+    __slots__ = ('history_id', 'prev', 'next')
+
+    def __init__(self, history_id: int, prev: Optional['_Entry'] = None, next: Optional['_Entry'] = None):
+        self.history_id = history_id
+        self.prev = prev
+        self.next = next
+
+
+class ReviewQueue:
+    """Ordered queue of pending review ids with a cursor and O(1) removal.
+
+    Only history ids are held per entry; full questions are loaded on demand
+    through loader (history ids -> {history_id: question}) and kept in a small
+    LRU, so a long queue costs a few dozen bytes per question.
+    """
+
+    def __init__(self, loader: Callable[[List[int]], Dict[int, Dict]], cache_size: int = 32,
+                 hydrate_ahead: int = 8):
+        self.loader = loader
+        self.cache_size = cache_size
+        self.hydrate_ahead = hydrate_ahead
+        self._entries: Dict[int, _Entry] = {}
+        self._head: Optional[_Entry] = None
+        self._tail: Optional[_Entry] = None
+        self._current: Optional[_Entry] = None
+        self._cache: 'OrderedDict[int, Dict]' = OrderedDict()
+
+    @classmethod
+    def from_pending(cls, db: Database, user_id: Optional[int], **options) -> 'ReviewQueue':
+        # Rebuilds a session's queue from the reviews still pending in the database
+        queue = cls(db.get_reviews, **options)
+        queue.add_ids(db.get_review_ids(user_id, 'pending'))
+        return queue
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, history_id: int) -> bool:
+        return history_id in self._entries
+
+    def __iter__(self) -> Iterator[int]:
+        entry = self._head
+        while entry is not None:
+            yield entry.history_id
+            entry = entry.next
+
+    def add_ids(self, history_ids: Iterable[int]) -> List[int]:
+        # Ids already queued keep their place; returns the ids actually added
+        added = []
+        for history_id in history_ids:
+            if history_id in self._entries:
+                continue
+            entry = _Entry(history_id, prev=self._tail)
+            if self._tail is None:
+                self._head = entry
+            else:
+                self._tail.next = entry
+            self._tail = entry
+            self._entries[history_id] = entry
+            added.append(history_id)
+        if self._current is None:
+            self._current = self._head
+        return added
+
+    def extend(self, questions: Iterable[Dict]) -> List[int]:
+        # Questions carry their 'history_id'; they are cached as they are already hydrated
+        questions = list(questions)
+        added = self.add_ids(question['history_id'] for question in questions)
+        for question in questions[-self.cache_size:]:
+            if question['history_id'] in self._entries:
+                self._remember(question['history_id'], question)
+        return added
+
+    def remove(self, history_id: int) -> bool:
+        entry = self._entries.pop(history_id, None)
+        if entry is None:
+            return False
+        if entry.prev is None:
+            self._head = entry.next
+        else:
+            entry.prev.next = entry.next
+        if entry.next is None:
+            self._tail = entry.prev
+        else:
+            entry.next.prev = entry.prev
+        if self._current is entry:
+            # The cursor moves on to the next question, or back from the end
+            self._current = entry.next or entry.prev
+        self._cache.pop(history_id, None)
+        return True
+
+    def clear(self):
+        self._entries.clear()
+        self._cache.clear()
+        self._head = self._tail = self._current = None
+
+    @property
+    def current_id(self) -> Optional[int]:
+        return self._current.history_id if self._current is not None else None
+
+    def seek(self, history_id: int) -> bool:
+        entry = self._entries.get(history_id)
+        if entry is not None:
+            self._current = entry
+        return entry is not None
+
+    def move(self, step: int):
+        # Clamped at both ends, like the old index-based navigation
+        entry = self._current
+        while entry is not None and step:
+            following = entry.next if step > 0 else entry.prev
+            if following is None:
+                break
+            entry = following
+            step += -1 if step > 0 else 1
+        self._current = entry
+
+    def current(self) -> Optional[Dict]:
+        history_id = self.current_id
+        return None if history_id is None else self.get(history_id)
+
+    def get(self, history_id: int) -> Optional[Dict]:
+        if history_id in self._cache:
+            self._cache.move_to_end(history_id)
+            return self._cache[history_id]
+        # Hydrate the requested question and the next few in one load
+        ids = [history_id]
+        entry = self._entries.get(history_id)
+        while entry is not None and len(ids) <= self.hydrate_ahead:
+            entry = entry.next
+            if entry is not None and entry.history_id not in self._cache:
+                ids.append(entry.history_id)
+        loaded = self.loader(ids)
+        for loaded_id in reversed(ids):
+            if loaded_id in loaded:
+                self._remember(loaded_id, loaded[loaded_id])
+        return self._cache.get(history_id)
+
+    def questions(self, batch_size: int = 200) -> Iterator[Dict]:
+        # Walks every queued question without filling the LRU
+        ids = list(self)
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            missing = [history_id for history_id in chunk if history_id not in self._cache]
+            loaded = self.loader(missing) if missing else {}
+            for history_id in chunk:
+                question = self._cache.get(history_id) or loaded.get(history_id)
+                if question is not None:
+                    question.setdefault('history_id', history_id)
+                    yield question
+
+    def _remember(self, history_id: int, question: Dict):
+        question.setdefault('history_id', history_id)
+        self._cache[history_id] = question
+        self._cache.move_to_end(history_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
@@ -0,0 +1,103 @@
+import functools
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from utils.db import Database
+from utils.metrics import metrics
+
+
+def _freeze(value):
+    # Read arguments become part of the memo key, so lists are made hashable
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class UnitOfWork:
+    """Request-scoped view of a Database for one Streamlit rerun.
+
+    Reads listed in READS are memoized until the next write. Status updates are
+    buffered and written together before the next read or when the request
+    ends, so reads still see them. round_trips counts the database calls a
+    request made; the total of the last finished request is last_round_trips.
+    """
+
+    READS = ('get_user_id', 'get_decided_hashes', 'get_user_history_page', 'get_review_ids', 'get_reviews',
+             'get_review_statuses', 'search_questions')
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.round_trips = 0
+        self.last_round_trips: Optional[int] = None
+        self._reads = {}
+        self._statuses: Dict[int, str] = {}
+        self._open = False
+
+    def __getattr__(self, name):
+        if name in self.READS:
+            return functools.partial(self.read, name)
+        raise AttributeError(name)
+
+    def begin(self):
+        # A request that never reached commit is finished first, so its writes
+        # are not held back; writes buffered by callbacks before the rerun are kept
+        if self._open:
+            self.commit()
+        self._reads.clear()
+        self.round_trips = 0
+        self._open = True
+
+    def commit(self):
+        self.flush()
+        self._open = False
+        self.last_round_trips = self.round_trips
+        metrics.increment("quiz_rerun_db_round_trips_total", self.round_trips)
+        metrics.increment("quiz_reruns_total")
+
+    @contextmanager
+    def request(self):
+        # Nested inside an open request (a fragment during a full rerun) this is a no-op
+        if self._open:
+            yield self
+            return
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.commit()
+
+    def scoped(self, fn):
+        # Decorator running each call of fn (e.g. a fragment rerun) as a request
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.request():
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def read(self, name: str, *args, **kwargs):
+        key = (name, _freeze(args), tuple(sorted((k, _freeze(v)) for k, v in kwargs.items())))
+        if key in self._reads:
+            return self._reads[key]
+        self.flush()
+        self.round_trips += 1
+        result = self._reads[key] = getattr(self.db, name)(*args, **kwargs)
+        return result
+
+    def write(self, name: str, *args, **kwargs):
+        # Any other Database write runs now, after the buffered statuses
+        self.flush()
+        self._reads.clear()
+        self.round_trips += 1
+        return getattr(self.db, name)(*args, **kwargs)
+
+    def update_question_status(self, history_id: int, status: str):
+        # Repeated clicks on the same question collapse to the last status
+        self._statuses[history_id] = status
+        self._reads.clear()
+
+    def flush(self):
+        if not self._statuses:
+            return
+        statuses, self._statuses = self._statuses, {}
+        self.round_trips += 1
+        self.db.update_question_statuses(statuses)